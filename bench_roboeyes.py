@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Hardware-free benchmark for the RoboEyes render and transport path.
+
+A MockBrick (nxt_mock) stands in for the NXT: it implements write_io_map/read_io_map
+on an in-memory IOMap and charges every call to a simulated link clock
+(per-call latency + per-byte cost), so runs are fast and repeatable.
+
+    python bench_roboeyes.py                       # print the table
+    python bench_roboeyes.py --save bench.json     # store a baseline
+    python bench_roboeyes.py --compare bench.json  # exit 1 on regression
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+from nxt_roboeyes import (NxtDisplay, RoboEyes, SCREEN_W, SCREEN_H,
+                          DEFAULT, TIRED, ANGRY, HAPPY, FROZEN, SCARY, CURIOUS)
+from nxt_mock import MockBrick, LATENCY_MODELS, NOREPLY_CALL_SHARE, USB_MAX_PAYLOAD
+
+MOODS = {'DEFAULT': DEFAULT, 'TIRED': TIRED, 'ANGRY': ANGRY, 'HAPPY': HAPPY,
+         'FROZEN': FROZEN, 'SCARY': SCARY, 'CURIOUS': CURIOUS}
+
+# Slowdown tolerated by --compare for timing metrics: relative, and an
+# absolute floor in ms so timer noise on tiny values is not reported
+TIME_TOLERANCE = 0.25
+TIME_FLOOR_MS = 0.05
+
+
+def run_scenario(mood, cyclops=False, frames=200, seed=1, pipeline=False):
+    """Render `frames` frames of one expression and measure them.
+
+    Blinks and gaze changes are triggered on a fixed schedule (no
+    wall-clock timers), so the frame stream is identical between runs.
+    """
+    random.seed(seed)
+    rnd = random.Random(seed)
+    brick = MockBrick(max_payload=USB_MAX_PAYLOAD if pipeline else None)
+    disp = NxtDisplay(brick)
+    if pipeline: disp.enable_pipelining()
+    show_ms = [0.0]
+
+    def show(eyes):
+        t = time.perf_counter()
+        eyes.fb.update()
+        show_ms[0] += (time.perf_counter() - t) * 1000
+
+    eyes = RoboEyes(disp, SCREEN_W, SCREEN_H, on_show=show)
+    eyes.set_cyclops(cyclops)
+    eyes.mood = mood
+    # Let the opening animation settle before measuring
+    for _ in range(20): eyes.draw_eyes()
+    brick.calls = brick.noreply_calls = brick.bytes = 0
+    show_ms[0] = 0.0
+    hits, misses = eyes.frameCache.hits, eyes.frameCache.misses
+
+    t0 = time.perf_counter()
+    for i in range(frames):
+        if i % 20 == 0: eyes.blink()
+        if i % 50 == 25:
+            eyes.eyeLxNext = rnd.randint(0, eyes.get_screen_constraint_X())
+            eyes.eyeLyNext = rnd.randint(0, eyes.get_screen_constraint_Y())
+        eyes.draw_eyes()
+    total_ms = (time.perf_counter() - t0) * 1000
+
+    render_ms = (total_ms - show_ms[0]) / frames
+    transport_cpu_ms = show_ms[0] / frames
+    res = {
+        'render_ms': round(render_ms, 4),
+        'transport_cpu_ms': round(transport_cpu_ms, 4),
+        'bytes_per_frame': brick.bytes / frames,
+        'calls_per_frame': brick.calls / frames,
+        'noreply_per_frame': brick.noreply_calls / frames,
+        'cache_hit_rate': round((eyes.frameCache.hits - hits) / max(1, eyes.frameCache.hits - hits + eyes.frameCache.misses - misses), 3),
+    }
+    # Achievable fps with the synchronous transport on each link model
+    for name, (per_call, per_byte) in LATENCY_MODELS.items():
+        round_trips = res['calls_per_frame'] - res['noreply_per_frame'] * (1 - NOREPLY_CALL_SHARE)
+        link_ms = round_trips * per_call + res['bytes_per_frame'] * per_byte
+        res['fps_' + name] = round(1000 / max(1e-6, render_ms + transport_cpu_ms + link_ms), 1)
+    return res
+
+
+def run_all(frames=200, seed=1, pipeline=False):
+    results = {}
+    for name, mood in MOODS.items():
+        results[name] = run_scenario(mood, frames=frames, seed=seed, pipeline=pipeline)
+    results['CYCLOPS'] = run_scenario(DEFAULT, cyclops=True, frames=frames, seed=seed, pipeline=pipeline)
+    return {
+        'meta': {'python': platform.python_version(), 'machine': platform.machine(), 'frames': frames, 'seed': seed,
+                 'pipeline': pipeline},
+        'results': results,
+    }
+
+
+def compare(current, baseline, tolerance=TIME_TOLERANCE):
+    """List of human readable regressions of current against baseline"""
+    problems = []
+    for name, base in baseline['results'].items():
+        cur = current['results'].get(name)
+        if cur is None:
+            problems.append(f'{name}: scenario missing')
+            continue
+        for key in ('render_ms', 'transport_cpu_ms'):
+            if cur[key] > base[key] * (1 + tolerance) + TIME_FLOOR_MS:
+                problems.append(f'{name}: {key} {base[key]:.3f} -> {cur[key]:.3f}')
+        # Wire traffic and call counts are deterministic, any growth counts
+        for key in ('bytes_per_frame', 'calls_per_frame'):
+            if cur[key] > base[key]:
+                problems.append(f'{name}: {key} {base[key]:g} -> {cur[key]:g}')
+    return problems
+
+
+def print_table(report):
+    cols = [('render_ms', 'render ms'), ('transport_cpu_ms', 'xfer cpu ms'),
+            ('bytes_per_frame', 'bytes/fr'), ('calls_per_frame', 'calls/fr'), ('cache_hit_rate', 'cache hit'),
+            ('fps_usb', 'fps usb'), ('fps_rfcomm', 'fps rfcomm')]
+    print('%-9s' % 'scenario' + ''.join('%13s' % title for _, title in cols))
+    for name, res in report['results'].items():
+        print('%-9s' % name + ''.join('%13g' % res[key] for key, _ in cols))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', metavar='PATH', help='write results as JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare against a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=TIME_TOLERANCE)
+    parser.add_argument('--pipeline', action='store_true', help='pipelined no-reply writes, USB sized chunks')
+    args = parser.parse_args()
+
+    report = run_all(args.frames, args.seed, args.pipeline)
+    print_table(report)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f'Baseline saved to {args.save}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        problems = compare(report, baseline, args.tolerance)
+        for p in problems: print('REGRESSION', p)
+        if problems: sys.exit(1)
+        print('No regressions.')
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,7 @@
 #!/usr/bin/env python3
 import time
 import math
-import sys
-import os
-import nxt.brick
-from nxt.backend.devfile import DevFileSock
+from nxt_connect import ConnectionManager
 
 # Параметры экрана NXT
 SCREEN_W = 100
@@ -95,21 +92,14 @@ def run_animation(brick):
 # --- Поиск и запуск ---
 
 def main():
-    # Попытка Bluetooth (rfcomm0) или USB
-    brick = None
-    if os.path.exists('/dev/rfcomm0'):
-        try:
-            brick = DevFileSock('/dev/rfcomm0').connect()
-        except: pass
-
-    if not brick:
-        import nxt.locator
-        try:
-            with nxt.locator.find() as b:
-                if b: run_animation(b)
-        except Exception as e:
-            print(f"NXT не найден: {e}")
-    else:
+    # Последнее рабочее подключение из кэша, иначе самое быстрое из rfcomm/USB/Bluetooth.
+    # При обрыве связи переподключение идёт в фоне.
+    try:
+        brick = ConnectionManager().connect(reconnect=True)
+    except Exception as e:
+        print(f"NXT не найден: {e}")
+        return
+    with brick:
         run_animation(brick)
 
 if __name__ == "__main__":
@@ -1,18 +1,22 @@
 import logging
-import nxt.brick
-from nxt.backend.devfile import DevFileSock
+from nxt_connect import ConnectionManager
 
 logging.basicConfig(level=logging.DEBUG)
 
 try:
-    print("Подключение к /dev/rfcomm0 через бэкенд devfile...")
-    # Используем класс DevFileSock напрямую из предоставленного вами devfile.py
-    sock = DevFileSock('/dev/rfcomm0')
-    
-    # Устанавливаем соединение
-    brick = sock.connect()
-    
-    print(f"✅ Успех! Кирпич найден: {brick.get_device_info()[0]}")
+    print("Поиск кирпичей: /dev/rfcomm*, USB, Bluetooth...")
+    manager = ConnectionManager()
+    # Каждое подключение проверяется замером read_io_map/write_io_map,
+    # самое быстрое запоминается для следующего запуска
+    results = manager.scan()
+    if not results:
+        raise RuntimeError("кирпич не найден")
+    for (backend, address), _, ms in results:
+        print(f"  {backend:9} {address:20} {ms:.1f} мс")
+
+    (backend, address), brick, ms = results[0]
+    manager.save((backend, address), ms)
+    print(f"✅ Успех! Кирпич найден: {brick.get_device_info()[0]} ({backend} {address}), запомнен в {manager.cache_path}")
     brick.play_tone(440, 250)
     
 except Exception as e:
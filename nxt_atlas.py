@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""Pre-baked animation atlas for RoboEyes.
+
+Blink, wink, laugh, confuse and mood changes always produce the same
+frames when they start from the same eye state. EyeAtlas renders them
+once on a headless copy of the eyes and stores the packed frames together
+with the animation state changes of each frame. While a clip covers the
+current state, RoboEyes.update() streams the stored buffers instead of
+tweening and rasterizing; any other state falls back to live rendering.
+
+    atlas = EyeAtlas.load_or_build('eyes.atlas', eyes)
+    eyes.atlas = atlas
+
+Clips are keyed by the full RoboEyes.anim_state() right after the action
+was triggered, so playback is exact for the pose the atlas was built in
+(normally the centred start pose). Timers (auto blink, idle moves) are
+not processed while a clip is playing. Clips are frame based, so eyes in
+TWEEN_TIME mode always render live. Blinks, winks and mood changes play
+at any frame rate; laugh and confuse last a fixed number of ms, so their
+clips only play at the frame interval they were recorded at.
+"""
+import base64
+import json
+import os
+import zlib
+
+from nxt_roboeyes import DEFAULT, TIRED, ANGRY, HAPPY, CURIOUS, TWEEN_TIME
+from nxt_headless import headless_eyes
+
+ATLAS_VERSION = 2
+ACTIONS = ('blink', 'wink_left', 'wink_right', 'laugh', 'confuse')
+# Moods the eyes settle in; FROZEN and SCARY flicker forever, so they are
+# never at rest and stay on live rendering.
+ATLAS_MOODS = (DEFAULT, TIRED, ANGRY, HAPPY, CURIOUS)
+# Give up on an animation that has not come to rest after this many frames
+MAX_CLIP_FRAMES = 120
+# Upper bound on distinct rest states explored by EyeAtlas.build()
+MAX_REST_STATES = 64
+# Animations timed in ms: how many frames they last depends on the frame rate
+TIMED_FLAGS = ('_laugh', '_confused')
+
+
+def _trigger(eyes, action):
+    if action == 'blink': eyes.blink()
+    elif action == 'wink_left': eyes.wink(left=True)
+    elif action == 'wink_right': eyes.wink(right=True)
+    elif action == 'laugh': eyes.laugh()
+    elif action == 'confuse': eyes.confuse()
+    else: raise ValueError(f"unknown atlas action {action!r}")
+
+
+def _freeze(value):
+    """JSON lists back to (hashable) tuples"""
+    if isinstance(value, list): return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _changes(prev, state):
+    """Entries of anim_state `state` that differ from `prev`"""
+    old = dict(prev)
+    return tuple((k, v) for k, v in state if old.get(k, v) != v or k not in old)
+
+
+class Clip:
+    __slots__ = ('name', 'frames', 'steps', 'interval')
+
+    def __init__(self, name, frames, steps, interval=None):
+        self.name = name
+        self.frames = frames # packed 800-byte frames
+        self.steps = steps   # per frame: (attribute, value) pairs that changed
+        self.interval = interval # frame interval it needs, None = any
+
+    def end_state(self, start):
+        state = dict(start)
+        for step in self.steps: state.update(step)
+        return tuple(sorted(state.items()))
+
+
+class EyeAtlas:
+    def __init__(self):
+        self.clips = {} # start anim_state -> Clip
+        self.hits = 0
+        self.misses = 0
+        self._frames = {} # identical frames are stored once
+
+    def __len__(self):
+        return len(self.clips)
+
+    # --- Building ---
+
+    def _record(self, eyes, clock):
+        """Frames and state changes until the eyes are at rest, None if they never are"""
+        frames, steps = [], []
+        prev = eyes.anim_state()
+        for _ in range(MAX_CLIP_FRAMES):
+            clock.advance(eyes.frameInterval)
+            eyes.update()
+            state = eyes.anim_state()
+            if state == prev: return frames, steps
+            frame = eyes.fb.get_frame()
+            frames.append(self._frames.setdefault(frame, frame))
+            steps.append(_changes(prev, state))
+            prev = state
+        return None
+
+    def _clone(self, state, interval):
+        eyes, clock = headless_eyes()
+        eyes.frameInterval = interval
+        eyes.set_anim_state(state)
+        return eyes, clock
+
+    def _add(self, name, eyes, clock):
+        """Record a clip from the current state, returns its end state"""
+        key = eyes.anim_state()
+        clip = self.clips.get(key)
+        if clip is None:
+            rec = self._record(eyes, clock)
+            if not rec or not rec[0]: return None
+            start = dict(key)
+            timed = any(start[flag] for flag in TIMED_FLAGS)
+            clip = self.clips[key] = Clip(name, *rec, eyes.frameInterval if timed else None)
+        return clip.end_state(key)
+
+    def build(self, eyes, moods=ATLAS_MOODS, actions=ACTIONS, transitions=True, max_states=MAX_REST_STATES):
+        """Render the clips for the current pose of `eyes`. Returns self.
+
+        Clips start from every rest state reachable from the settled moods:
+        after a blink the eyes rest with slightly different flags (eyeL_open
+        etc.) than before, and those states get their own clips too.
+        """
+        base = eyes.anim_state()
+        interval = eyes.frameInterval
+        queue = []
+        for mood in moods:
+            clone, clock = self._clone(base, interval)
+            clone.mood = mood
+            if self._record(clone, clock) is not None: queue.append((mood, clone.anim_state()))
+
+        seen = set(state for _, state in queue)
+        while queue:
+            mood, state = queue.pop(0)
+            steps = [(f'{action}@{mood}', mood, action) for action in actions]
+            if transitions:
+                steps += [(f'mood {mood}->{target}', target, None) for target in moods if target != mood]
+            for name, next_mood, action in steps:
+                clone, clock = self._clone(state, interval)
+                if action: _trigger(clone, action)
+                else: clone.mood = next_mood
+                end = self._add(name, clone, clock)
+                if end is not None and end not in seen and len(seen) < max_states:
+                    seen.add(end)
+                    queue.append((next_mood, end))
+        return self
+
+    # --- Playback ---
+
+    def play(self, eyes):
+        """Show the next atlas frame on `eyes`. False = render live instead"""
+        if eyes.tweenMode == TWEEN_TIME: return False
+        clip = eyes._atlasClip
+        if clip is None:
+            if not eyes._atlasCheck or not eyes._cacheable: return False
+            eyes._atlasCheck = False
+            clip = self.clips.get(eyes.anim_state())
+            if clip is not None and clip.interval not in (None, eyes.frameInterval): clip = None
+            if clip is None:
+                self.misses += 1
+                return False
+            self.hits += 1
+            eyes._atlasClip = clip
+            eyes._atlasPos = 0
+        pos = eyes._atlasPos
+        eyes._atlasPos = pos + 1
+        if eyes._atlasPos >= len(clip.frames): eyes._atlasClip = None
+        # Keep the live state in step, so the clip can be cut at any frame
+        eyes.set_anim_state(clip.steps[pos])
+        eyes.show_frame(clip.frames[pos])
+        return True
+
+    # --- Persistence ---
+
+    def save(self, path):
+        index = {}
+        frames = []
+        clips = []
+        for key, clip in self.clips.items():
+            ids = []
+            for frame in clip.frames:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append(base64.b64encode(frame).decode('ascii'))
+                ids.append(index[frame])
+            clips.append({'name': clip.name, 'key': key, 'frames': ids, 'steps': clip.steps, 'interval': clip.interval})
+        data = {'version': ATLAS_VERSION, 'frames': frames, 'clips': clips}
+        with open(path, 'wb') as f:
+            f.write(zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'), 9))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            data = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+        atlas = cls()
+        if data.get('version') != ATLAS_VERSION: return atlas
+        frames = [base64.b64decode(b) for b in data['frames']]
+        for c in data['clips']:
+            clip = Clip(c['name'], [frames[i] for i in c['frames']], [_freeze(s) for s in c['steps']], c.get('interval'))
+            atlas.clips[_freeze(c['key'])] = clip
+        return atlas
+
+    @classmethod
+    def load_or_build(cls, path, eyes, **kw):
+        """Load the atlas from `path`, or build it for `eyes` and save it there"""
+        if os.path.exists(path):
+            try:
+                atlas = cls.load(path)
+                if atlas.clips: return atlas
+            except (OSError, ValueError, KeyError, zlib.error):
+                pass # corrupt or foreign file, rebuild it
+        atlas = cls().build(eyes, **kw)
+        atlas.save(path)
+        return atlas
@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""Play images and animations (PBM/PGM/PPM, GIF) on the NXT screen.
+
+Every stage is a generator, so a clip is decoded, scaled, dithered and
+sent one frame at a time and never held in memory as a whole:
+
+    decode(path)            (delay_ms, width, height, gray) per frame,
+                            gray = width*height bytes, 0 black .. 255 white
+    fit_frame(gray, w, h)   100x64 gray, 'contain' (letterbox), 'cover'
+                            (crop) or 'stretch'
+    dither(gray)            800-byte NXT page layout frame, dark pixels set
+                            ('floyd' Floyd-Steinberg, 'bayer', 'threshold')
+
+    play('run.gif', NxtDisplay(brick, async_transport=True), loops=3)
+
+Frames go through NxtDisplay.update(), so only the bytes that changed
+since the previous frame are sent. 'bayer' dithering keeps unchanged
+image areas identical from frame to frame, which makes those deltas
+smaller than with Floyd-Steinberg.
+
+Converted clips are cached as frame recordings (see nxt_record) in
+CACHE_DIR, keyed by a hash of the source file and the conversion
+options; the first play converts and fills the cache as it goes.
+
+    python nxt_clip.py play run.gif --loops 0
+    python nxt_clip.py play run.gif --mock rfcomm --dither bayer
+    python nxt_clip.py convert run.gif --format png --out frames/run_%04d.png
+"""
+import argparse
+import hashlib
+import os
+import struct
+import time
+
+from nxt_roboeyes import NxtDisplay, SCREEN_W, SCREEN_H, BUFFER_SIZE
+from nxt_headless import SimClock, export
+from nxt_record import Recorder, read_records
+from nxt_mock import MockBrick
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'nxt_roboeyes', 'clips')
+# Bump when conversion output changes, so stale cache entries are not used
+CLIP_VERSION = 1
+# Delay of still images and PNM frames (ms)
+FRAME_MS = 100
+# GIF delays below this are shown as GIF_DEFAULT_DELAY, like browsers do
+GIF_MIN_DELAY = 20
+GIF_DEFAULT_DELAY = 100
+FITS = ('contain', 'cover', 'stretch')
+DITHERS = ('floyd', 'bayer', 'threshold')
+BAYER4 = ((0, 8, 2, 10), (12, 4, 14, 6), (3, 11, 1, 9), (15, 7, 13, 5))
+
+
+def _luma(r, g, b):
+    return (299 * r + 587 * g + 114 * b) // 1000
+
+
+# --- PBM/PGM/PPM ---
+
+def _pnm_token(f):
+    """Next header token, skipping whitespace and comments. Consumes the
+    single whitespace byte after it, as the format requires"""
+    tok = bytearray()
+    while True:
+        c = f.read(1)
+        if not c: break
+        if c == b'#' and not tok:
+            while c not in (b'\n', b'\r', b''): c = f.read(1)
+            continue
+        if c.isspace():
+            if tok: break
+            continue
+        tok += c
+    return bytes(tok)
+
+def _pnm_ascii(f, count, bits=False):
+    """`count` ASCII samples; P1 digits need no separator"""
+    out = []
+    while len(out) < count:
+        if bits:
+            c = f.read(1)
+            if not c: break
+            if c in b'01': out.append(c[0] - 48)
+            elif c == b'#': f.readline()
+        else:
+            tok = _pnm_token(f)
+            if not tok: break
+            out.append(int(tok))
+    if len(out) < count: raise ValueError("truncated PNM image")
+    return out
+
+def read_pnm(f, frame_ms=FRAME_MS):
+    """Generator of (delay_ms, w, h, gray) for every image in a PBM/PGM/PPM
+    file (P1-P6; several images may follow each other)"""
+    while True:
+        magic = _pnm_token(f)
+        if not magic: return
+        if len(magic) != 2 or magic[:1] != b'P' or magic[1:] not in b'123456':
+            raise ValueError(f"not a PNM image: {magic!r}")
+        kind = magic[1] - 48
+        w, h = int(_pnm_token(f)), int(_pnm_token(f))
+        maxval = 1 if kind in (1, 4) else int(_pnm_token(f))
+        if w <= 0 or h <= 0 or not 0 < maxval < 65536: raise ValueError("bad PNM header")
+        n = w * h
+        if kind == 4:
+            stride = (w + 7) // 8
+            raw = f.read(stride * h)
+            if len(raw) < stride * h: raise ValueError("truncated PNM image")
+            gray = bytearray(n)
+            for y in range(h):
+                row = raw[y * stride:(y + 1) * stride]
+                for x in range(w):
+                    if not row[x >> 3] & (0x80 >> (x & 7)): gray[y * w + x] = 255
+        elif kind == 1:
+            gray = bytearray(0 if v else 255 for v in _pnm_ascii(f, n, bits=True))
+        else:
+            channels = 3 if kind in (3, 6) else 1
+            if kind in (2, 3):
+                samples = _pnm_ascii(f, n * channels)
+            else:
+                size = 2 if maxval > 255 else 1
+                raw = f.read(n * channels * size)
+                if len(raw) < n * channels * size: raise ValueError("truncated PNM image")
+                samples = raw if size == 1 else struct.unpack(f'>{n * channels}H', raw)
+            if maxval != 255: samples = [min(v, maxval) * 255 // maxval for v in samples]
+            if channels == 3:
+                gray = bytearray(map(_luma, samples[0::3], samples[1::3], samples[2::3]))
+            else:
+                gray = bytearray(samples)
+        yield frame_ms, w, h, bytes(gray)
+
+
+# --- GIF ---
+
+def _gif_blocks(f):
+    """Data sub-blocks up to the terminator, joined"""
+    out = bytearray()
+    while True:
+        size = f.read(1)
+        if not size or not size[0]: return bytes(out)
+        out += f.read(size[0])
+
+def _gif_palette(f, packed):
+    raw = f.read(3 << ((packed & 7) + 1))
+    return bytes(_luma(*raw[i:i + 3]) for i in range(0, len(raw) - 2, 3)).ljust(256, b'\xff')
+
+def lzw_decode(data, min_size, count, fill=0):
+    """GIF LZW codes -> `count` palette indices (short data is padded with `fill`)"""
+    if not 1 <= min_size <= 11: raise ValueError("bad LZW code size")
+    clear = 1 << min_size
+    end = clear + 1
+    base = [bytes((i,)) for i in range(clear)] + [b'', b'']
+    table = list(base)
+    size = min_size + 1
+    mask = (1 << size) - 1
+    out = bytearray()
+    prev = None
+    bits = nbits = 0
+    for byte in data:
+        bits |= byte << nbits
+        nbits += 8
+        while nbits >= size:
+            code = bits & mask
+            bits >>= size
+            nbits -= size
+            if code == clear:
+                table = list(base)
+                size = min_size + 1
+                mask = (1 << size) - 1
+                prev = None
+                continue
+            if code == end or len(out) >= count:
+                return bytes(out[:count].ljust(count, bytes((fill,))))
+            if code < len(table):
+                entry = table[code]
+                if prev is not None and len(table) < 4096: table.append(prev + entry[:1])
+            elif code == len(table) and prev is not None:
+                entry = prev + prev[:1]
+                table.append(entry)
+            else:
+                raise ValueError("corrupt GIF image data")
+            out += entry
+            prev = entry
+            if len(table) == mask + 1 and size < 12:
+                size += 1
+                mask = (1 << size) - 1
+    return bytes(out[:count].ljust(count, bytes((fill,))))
+
+def _interlaced_rows(h):
+    return list(range(0, h, 8)) + list(range(4, h, 8)) + list(range(2, h, 4)) + list(range(1, h, 2))
+
+def read_gif(f):
+    """Generator of (delay_ms, w, h, gray) for every GIF frame, composited
+    on the logical screen (transparent areas are white)"""
+    if f.read(6) not in (b'GIF87a', b'GIF89a'): raise ValueError("not a GIF image")
+    w, h, packed, _, _ = struct.unpack('<HHBBB', f.read(7))
+    palette = _gif_palette(f, packed) if packed & 0x80 else bytes(range(256))
+    canvas = bytearray(b'\xff' * (w * h))
+    delay, trans, disposal = GIF_DEFAULT_DELAY, None, 0
+    restore = None # (disposal, rect, saved canvas) of the previous frame
+    while True:
+        intro = f.read(1)
+        if intro in (b'', b';'): return
+        if intro == b'!':
+            label = f.read(1)
+            data = _gif_blocks(f)
+            if label == b'\xf9' and len(data) >= 4:
+                flags, cs, index = struct.unpack('<BHB', data[:4])
+                disposal = (flags >> 2) & 7
+                trans = index if flags & 1 else None
+                delay = cs * 10 if cs * 10 >= GIF_MIN_DELAY else GIF_DEFAULT_DELAY
+            continue
+        if intro != b',': raise ValueError(f"corrupt GIF block {intro!r}")
+        left, top, iw, ih, packed = struct.unpack('<HHHHB', f.read(9))
+        lut = _gif_palette(f, packed) if packed & 0x80 else palette
+        min_size = f.read(1)
+        indices = lzw_decode(_gif_blocks(f), min_size[0] if min_size else 0, iw * ih, trans or 0)
+        if restore:
+            mode, (rx, ry, rw, rh), saved = restore
+            for y in range(ry, ry + rh):
+                a = y * w + rx
+                canvas[a:a + rw] = saved[a:a + rw] if mode == 3 else b'\xff' * rw
+        n = max(0, min(iw, w - left))
+        rows = _interlaced_rows(ih) if packed & 0x40 else range(ih)
+        saved = bytes(canvas) if disposal == 3 else None
+        for k, row in enumerate(rows):
+            y = top + row
+            if y >= h or not n: continue
+            seg = indices[k * iw:k * iw + n]
+            painted = seg.translate(lut)
+            a = y * w + left
+            if trans is None or trans not in seg:
+                canvas[a:a + n] = painted
+            else:
+                for x, v in enumerate(seg):
+                    if v != trans: canvas[a + x] = painted[x]
+        restore = (disposal, (left, top, n, max(0, min(ih, h - top))), saved) if disposal in (2, 3) else None
+        yield delay, w, h, bytes(canvas)
+        delay, trans, disposal = GIF_DEFAULT_DELAY, None, 0
+
+
+def decode(path, frame_ms=FRAME_MS):
+    """Generator of (delay_ms, w, h, gray) for a local image file, by content"""
+    with open(path, 'rb') as f:
+        magic = f.read(2)
+        f.seek(0)
+        if magic == b'GI': yield from read_gif(f)
+        elif magic[:1] == b'P': yield from read_pnm(f, frame_ms)
+        else: raise ValueError(f"{path}: not a PBM/PGM/PPM or GIF image")
+
+
+# --- Scaling and dithering ---
+
+def _ranges(start, src, dst):
+    """Source [a, b) of every destination pixel: box average when
+    shrinking, nearest pixel when enlarging"""
+    out = []
+    for i in range(dst):
+        a = start + i * src // dst
+        out.append((a, max(start + (i + 1) * src // dst, a + 1)))
+    return out
+
+def fit_frame(gray, w, h, fit='contain'):
+    """Scale a w*h gray image to the screen, returns SCREEN_W*SCREEN_H gray
+    (letterbox bars are white)"""
+    sx, sy, sw, sh = 0, 0, w, h
+    dw, dh = SCREEN_W, SCREEN_H
+    if fit == 'contain':
+        scale = min(SCREEN_W / w, SCREEN_H / h)
+        dw, dh = max(1, min(SCREEN_W, round(w * scale))), max(1, min(SCREEN_H, round(h * scale)))
+    elif fit == 'cover':
+        scale = max(SCREEN_W / w, SCREEN_H / h)
+        sw, sh = max(1, min(w, round(SCREEN_W / scale))), max(1, min(h, round(SCREEN_H / scale)))
+        sx, sy = (w - sw) // 2, (h - sh) // 2
+    elif fit != 'stretch':
+        raise ValueError(f"fit must be one of {FITS}")
+    ox, oy = (SCREEN_W - dw) // 2, (SCREEN_H - dh) // 2
+    cols = _ranges(sx, sw, dw)
+    widths = [b - a for a, b in cols]
+    sums = {}
+    def row_sums(y):
+        r = sums.get(y)
+        if r is None:
+            row = gray[y * w:(y + 1) * w]
+            r = sums[y] = [sum(row[a:b]) for a, b in cols]
+        return r
+    out = bytearray(b'\xff' * (SCREEN_W * SCREEN_H))
+    for j, (a, b) in enumerate(_ranges(sy, sh, dh)):
+        totals = map(sum, zip(*[row_sums(y) for y in range(a, b)]))
+        pos = (oy + j) * SCREEN_W + ox
+        out[pos:pos + dw] = bytes(t // ((b - a) * n) for t, n in zip(totals, widths))
+    return bytes(out)
+
+def dither(gray, method='floyd', threshold=128, invert=False):
+    """SCREEN_W*SCREEN_H gray -> 800-byte page layout frame, pixels darker
+    than `threshold` are set (black on the LCD); invert swaps that"""
+    if method not in DITHERS: raise ValueError(f"dither must be one of {DITHERS}")
+    frame = bytearray(BUFFER_SIZE)
+    px = [255 - v for v in gray] if invert else list(gray)
+    for y in range(SCREEN_H):
+        base = (y >> 3) * SCREEN_W
+        bit = 1 << (y & 7)
+        row = y * SCREEN_W
+        if method == 'threshold':
+            for x in range(SCREEN_W):
+                if px[row + x] < threshold: frame[base + x] |= bit
+            continue
+        if method == 'bayer':
+            levels = [(t * 16 + 8) * threshold // 128 for t in BAYER4[y & 3]]
+            for x in range(SCREEN_W):
+                if px[row + x] < levels[x & 3]: frame[base + x] |= bit
+            continue
+        # Floyd-Steinberg, serpentine
+        step = 1 if y % 2 == 0 else -1
+        below = y < SCREEN_H - 1
+        for x in (range(SCREEN_W) if step == 1 else range(SCREEN_W - 1, -1, -1)):
+            i = row + x
+            old = px[i]
+            if old < threshold:
+                frame[base + x] |= bit
+                err = old
+            else:
+                err = old - 255
+            if not err: continue
+            e7, e3, e5 = err * 7 // 16, err * 3 // 16, err * 5 // 16
+            e1 = err - e7 - e3 - e5
+            ahead = 0 <= x + step < SCREEN_W
+            if ahead: px[i + step] += e7
+            if below:
+                j = i + SCREEN_W
+                if 0 <= x - step < SCREEN_W: px[j - step] += e3
+                px[j] += e5
+                if ahead: px[j + step] += e1
+    return bytes(frame)
+
+
+# --- Pipeline ---
+
+def clip_frames(path, fit='contain', method='floyd', threshold=128, invert=False, frame_ms=FRAME_MS):
+    """Generator of (delay_ms, frame) for an image file, converted on the fly"""
+    for delay, w, h, gray in decode(path, frame_ms):
+        yield delay, dither(fit_frame(gray, w, h, fit), method, threshold, invert)
+
+def source_hash(path, options=()):
+    """Cache key: the file contents plus conversion options"""
+    digest = hashlib.sha256(repr((CLIP_VERSION, tuple(options))).encode())
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''): digest.update(block)
+    return digest.hexdigest()
+
+def cache_path(path, cache_dir=CACHE_DIR, **opts):
+    return os.path.join(cache_dir, source_hash(path, sorted(opts.items()))[:32] + '.nxr')
+
+def _cached(file):
+    """(delay_ms, frame) from a cache recording; the last record marks the
+    end of the last frame"""
+    prev = None
+    for rec in read_records(file):
+        if prev is not None: yield rec.t_ms - prev.t_ms, prev.frame
+        prev = rec
+
+def _convert_into(path, file, opts):
+    """clip_frames() that also writes the cache; the entry only appears
+    once the whole clip has been converted"""
+    tmp = f'{file}.{os.getpid()}.tmp'
+    os.makedirs(os.path.dirname(file) or '.', exist_ok=True)
+    clock = SimClock()
+    done = False
+    frame = None
+    try:
+        with Recorder(tmp, clock=clock) as rec:
+            for delay, frame in clip_frames(path, **opts):
+                rec.add(frame)
+                yield delay, frame
+                clock.advance(delay)
+            if frame is not None: rec.add(frame)
+        done = frame is not None
+    finally:
+        if done: os.replace(tmp, file)
+        elif os.path.exists(tmp): os.remove(tmp)
+
+def _from_cache(path, file, opts):
+    if os.path.exists(file): return _cached(file)
+    return _convert_into(path, file, opts)
+
+def cached_frames(path, cache_dir=CACHE_DIR, **opts):
+    """clip_frames() through the disk cache"""
+    return _from_cache(path, cache_path(path, cache_dir, **opts), opts)
+
+def play(path, display, loops=1, speed=1.0, cache=True, cache_dir=CACHE_DIR, sleep=time.sleep, **opts):
+    """Show a clip on an NxtDisplay at its own timing, loops=0 repeats
+    forever. Frames whose time already passed are skipped, so a slow link
+    drops frames instead of slowing the clip down (the last frame is always
+    shown). Returns (shown, skipped)."""
+    # Hash the source once, not on every loop
+    file = cache_path(path, cache_dir, **opts) if cache else None
+    start = time.monotonic()
+    t = shown = skipped = loop = 0
+    late = None
+    while not loops or loop < loops:
+        frames = _from_cache(path, file, opts) if file else clip_frames(path, **opts)
+        for delay, frame in frames:
+            due = start + t / 1000 / speed
+            t += delay
+            now = time.monotonic()
+            if now >= start + t / 1000 / speed:
+                skipped += 1
+                late = frame
+                continue
+            if due > now: sleep(due - now)
+            display.set_frame(frame)
+            display.update()
+            shown += 1
+            late = None
+        loop += 1
+        if not t: break # nothing decoded
+    if late is not None:
+        display.set_frame(late)
+        display.update()
+        shown, skipped = shown + 1, skipped - 1
+    wait = start + t / 1000 / speed - time.monotonic()
+    if wait > 0: sleep(wait)
+    return shown, skipped
+
+
+# --- CLI ---
+
+def _options(args):
+    return dict(fit=args.fit, method=args.dither, threshold=args.threshold, invert=args.invert, frame_ms=args.frame_ms)
+
+def _play(args):
+    if args.mock:
+        brick = MockBrick(args.mock, sleep=True)
+        disp = NxtDisplay(brick, async_transport=True)
+    else:
+        from nxt_connect import ConnectionManager
+        brick = ConnectionManager().connect()
+        disp = NxtDisplay(brick, async_transport=True)
+        disp.enable_pipelining()
+    try:
+        shown, skipped = play(args.file, disp, args.loops, args.speed, not args.no_cache, args.cache_dir, **_options(args))
+        disp.flush()
+        print(f"{shown} frames shown, {skipped} skipped, {disp.bytes_sent} bytes sent")
+    finally:
+        disp.close()
+        if not args.mock: brick.close()
+
+def _convert(args):
+    def timed():
+        t = 0
+        for delay, frame in cached_frames(args.file, args.cache_dir, **_options(args)):
+            yield t, frame
+            t += delay
+    n = export(timed(), args.out, args.format)
+    print(f"Wrote {n} frames to {args.out}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Play PBM/PGM/PPM and GIF clips on the NXT screen.')
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p = sub.add_parser('play')
+    p.add_argument('--loops', type=int, default=1, help='0 = forever')
+    p.add_argument('--speed', type=float, default=1.0)
+    p.add_argument('--no-cache', action='store_true')
+    p.add_argument('--mock', choices=('none', 'usb', 'rfcomm'), help='MockBrick instead of a real brick')
+    p.set_defaults(func=_play)
+    p2 = sub.add_parser('convert', help='write converted frames as images (see nxt_headless)')
+    p2.add_argument('--format', choices=('png', 'pbm', 'raw'), default='png')
+    p2.add_argument('--out', default='frames/clip_%04d.png')
+    p2.set_defaults(func=_convert)
+    for p in (p, p2):
+        p.add_argument('file')
+        p.add_argument('--fit', choices=FITS, default='contain')
+        p.add_argument('--dither', choices=DITHERS, default='floyd')
+        p.add_argument('--threshold', type=int, default=128)
+        p.add_argument('--invert', action='store_true')
+        p.add_argument('--frame-ms', type=int, default=FRAME_MS, help='delay of PNM frames')
+        p.add_argument('--cache-dir', default=CACHE_DIR)
+    args = parser.parse_args()
+    try:
+        args.func(args)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
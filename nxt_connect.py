@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""Find, remember and keep up the link to an NXT brick.
+
+ConnectionManager probes every reachable endpoint (rfcomm device files,
+USB, and a Bluetooth scan only when nothing else answers) with timed
+read_io_map/write_io_map round trips, picks the fastest and stores it in
+a small JSON file, so the next start connects without a locator scan.
+
+    manager = ConnectionManager()
+    brick = manager.connect(reconnect=True)
+    disp = NxtDisplay(brick, async_transport=True)
+    brick.attach(disp)
+
+With reconnect=True the brick is a ReconnectingBrick: when a call fails
+it drops the link and reconnects in a background thread. Meanwhile calls
+fail at once, so RoboEyes keeps rendering (NxtDisplay counts the
+transport errors and forgets its shadow). On recovery the last frame of
+every attached display is written in full.
+"""
+import glob
+import json
+import logging
+import os
+import statistics
+import threading
+import time
+
+import nxt.locator
+from nxt.backend.devfile import DevFileSock
+
+from nxt_roboeyes import MOD_DISPLAY, DISPLAY_OFFSET, CHUNK_SIZE, BUFFER_SIZE
+
+log = logging.getLogger('nxt_roboeyes.connect')
+
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'nxt_roboeyes', 'link.json')
+# Round trips per endpoint when probing (the median is kept)
+PROBE_COUNT = 5
+PROBE_SIZE = 40
+# Reconnect back-off (seconds), doubles up to the maximum
+RECONNECT_MIN = 0.5
+RECONNECT_MAX = 5.0
+# Every this many failed reconnects the cached endpoint is skipped for a full scan
+RESCAN_EVERY = 4
+
+
+def _close(brick):
+    try:
+        brick.close()
+    except Exception:
+        pass
+
+
+class ConnectionManager:
+    def __init__(self, cache_path=CACHE_PATH, probe_count=PROBE_COUNT, bluetooth_scan=True):
+        self.cache_path = cache_path
+        self.probe_count = probe_count
+        self.bluetooth_scan = bluetooth_scan
+
+    # --- Endpoints: (backend, address) ---
+
+    def open(self, endpoint):
+        """Connect to one endpoint, returns the brick"""
+        backend, address = endpoint
+        if backend == 'devfile': return DevFileSock(address).connect()
+        return nxt.locator.find(backends=[backend], host=address, config=None)
+
+    def candidates(self):
+        """(endpoint, brick) for every brick that answers, connected"""
+        found = []
+        for path in sorted(glob.glob('/dev/rfcomm*')):
+            try:
+                found.append((('devfile', path), DevFileSock(path).connect()))
+            except OSError as e:
+                log.debug("%s: %r", path, e)
+        backends = ['usb'] + (['bluetooth'] if self.bluetooth_scan else [])
+        for backend in backends:
+            # A Bluetooth inquiry takes seconds: only when nothing else answered
+            if backend == 'bluetooth' and found: break
+            try:
+                for brick in nxt.locator.find(find_all=True, backends=[backend], config=None):
+                    found.append(((backend, brick.get_device_info()[1]), brick))
+            except Exception as e:
+                log.debug("%s scan failed: %r", backend, e)
+        return found
+
+    def probe(self, brick):
+        """Median ms of a display read + write back (the screen is unchanged)"""
+        times = []
+        for _ in range(self.probe_count):
+            t0 = time.perf_counter()
+            _, data = brick.read_io_map(MOD_DISPLAY, DISPLAY_OFFSET, PROBE_SIZE)
+            brick.write_io_map(MOD_DISPLAY, DISPLAY_OFFSET, bytes(data))
+            times.append((time.perf_counter() - t0) * 1000)
+        return statistics.median(times)
+
+    # --- Cache ---
+
+    def load(self):
+        """The cached endpoint, None if there is none"""
+        try:
+            with open(self.cache_path) as f:
+                data = json.load(f)
+            return data['backend'], data['address']
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, endpoint, latency_ms):
+        folder = os.path.dirname(self.cache_path)
+        if folder: os.makedirs(folder, exist_ok=True)
+        with open(self.cache_path, 'w') as f:
+            json.dump({'backend': endpoint[0], 'address': endpoint[1], 'latency_ms': round(latency_ms, 2),
+                       'time': time.time()}, f)
+
+    def forget(self):
+        try:
+            os.remove(self.cache_path)
+        except OSError:
+            pass
+
+    # --- Connecting ---
+
+    def _cached(self):
+        endpoint = self.load()
+        if endpoint is None: return None
+        try:
+            brick = self.open(endpoint)
+            brick.read_io_map(MOD_DISPLAY, DISPLAY_OFFSET, 1)
+            log.info("connected to cached %s %s", *endpoint)
+            return brick
+        except Exception as e:
+            log.info("cached %s %s failed: %r", endpoint[0], endpoint[1], e)
+            return None
+
+    def scan(self):
+        """Probe every candidate, keep the fastest. Returns (endpoint, brick, ms)
+        sorted fastest first, all but the first closed"""
+        results = []
+        for endpoint, brick in self.candidates():
+            try:
+                ms = self.probe(brick)
+            except Exception as e:
+                log.info("%s %s does not answer: %r", endpoint[0], endpoint[1], e)
+                _close(brick)
+                continue
+            log.info("%s %s: %.1f ms", endpoint[0], endpoint[1], ms)
+            results.append((endpoint, brick, ms))
+        results.sort(key=lambda r: r[2])
+        for _, brick, _ in results[1:]: _close(brick)
+        return results
+
+    def connect(self, reconnect=False, rescan=False):
+        """Connect to the cached endpoint, or scan for the fastest one.
+        Raises nxt.locator.BrickNotFoundError when no brick answers."""
+        brick = None if rescan else self._cached()
+        if brick is None:
+            results = self.scan()
+            if not results: raise nxt.locator.BrickNotFoundError("no brick found")
+            endpoint, brick, ms = results[0]
+            self.save(endpoint, ms)
+        return ReconnectingBrick(self, brick) if reconnect else brick
+
+
+class ReconnectingBrick:
+    """Brick proxy that reconnects in the background when the link drops"""
+    def __init__(self, manager, brick):
+        self.manager = manager
+        self.brick = brick
+        self.displays = []
+        self.reconnects = 0
+        self.failures = 0
+        self._lock = threading.RLock()
+        self._thread = None
+        self._closed = False
+
+    @property
+    def connected(self):
+        return self.brick is not None
+
+    def attach(self, display):
+        """Resend display.last_frame in full after a reconnect"""
+        self.displays.append(display)
+
+    def write_io_map(self, mod_id, offset, data):
+        return self._call('write_io_map', mod_id, offset, data)
+
+    def read_io_map(self, mod_id, offset, size):
+        return self._call('read_io_map', mod_id, offset, size)
+
+    def __getattr__(self, name):
+        # play_tone, get_device_info, _cmd_noreply ... go through the same
+        # error handling, plain attributes (_sock.bsize) are passed through
+        if self.brick is None: raise AttributeError(name)
+        attr = getattr(self.brick, name)
+        if not callable(attr): return attr
+        return lambda *args, **kw: self._call(name, *args, **kw)
+
+    def _call(self, name, *args, **kw):
+        with self._lock:
+            if self.brick is None: raise ConnectionError("NXT link down, reconnecting")
+            try:
+                return getattr(self.brick, name)(*args, **kw)
+            except Exception as e:
+                self._lost(e)
+                raise
+
+    def _lost(self, error):
+        self.failures += 1
+        log.warning("NXT link lost: %r", error)
+        _close(self.brick)
+        self.brick = None
+        if not self._closed and (self._thread is None or not self._thread.is_alive()):
+            self._thread = threading.Thread(target=self._reconnect, name='nxt-reconnect', daemon=True)
+            self._thread.start()
+
+    def _reconnect(self):
+        delay = RECONNECT_MIN
+        attempt = 0
+        while not self._closed:
+            attempt += 1
+            try:
+                brick = self.manager.connect(rescan=attempt % RESCAN_EVERY == 0)
+            except Exception as e:
+                log.debug("reconnect attempt %d failed: %r", attempt, e)
+                time.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX)
+                continue
+            with self._lock:
+                if self._closed:
+                    _close(brick)
+                    return
+                try:
+                    self._restore(brick)
+                except Exception as e:
+                    log.debug("resend after reconnect failed: %r", e)
+                    _close(brick)
+                    continue
+                self.brick = brick
+                self.reconnects += 1
+            log.warning("NXT link restored")
+            return
+
+    def _restore(self, brick):
+        # The brick may show anything after a reset: write whole frames and
+        # make the displays send the full frame next time as well
+        for disp in self.displays:
+            frame = disp.last_frame
+            if frame is not None:
+                for pos in range(0, BUFFER_SIZE, CHUNK_SIZE):
+                    brick.write_io_map(MOD_DISPLAY, DISPLAY_OFFSET + pos, frame[pos:pos + CHUNK_SIZE])
+            disp.invalidate()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            if self.brick is not None: _close(self.brick)
+            self.brick = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""RoboEyes daemon: one process owns the brick, scripts talk to it over a socket.
+
+Connecting and locating the brick takes seconds; the daemon does it once
+and keeps NxtDisplay and RoboEyes running. Clients send JSON lines over a
+Unix socket (or TCP) and get an answer as soon as the command is applied
+to the animation state, long before the frame is on the brick:
+
+    -> {"id": 1, "cmd": "mood", "mood": "HAPPY"}
+    <- {"id": 1, "ok": true}
+
+Commands: mood, blink, wink, laugh, confuse, look (direction N..NW or
+CENTER, or x/y), autoblink, idle, cyclops, sequence (steps of
+[ms, cmd, {args}]), status, ping. Commands only change state: everything
+that arrives within one frame interval ends up in a single render.
+
+    python nxt_eyesd.py serve                      # brick via nxt_connect
+    python nxt_eyesd.py serve --mock --tcp 127.0.0.1:7777
+    python nxt_eyesd.py send mood mood=HAPPY
+    python nxt_eyesd.py send sequence 'steps=[[0,"laugh",{}],[1500,"mood",{"mood":"DEFAULT"}]]'
+"""
+import argparse
+import asyncio
+import errno
+import inspect
+import json
+import logging
+import os
+import socket
+import stat
+import tempfile
+
+from nxt_roboeyes import NxtDisplay, RoboEyes, SCREEN_W, SCREEN_H, TWEEN_TIME, RUN_MAX_SLEEP, \
+    N, NE, E, SE, S, SW, W, NW
+from nxt_headless import MOODS
+from nxt_mock import MockBrick
+
+log = logging.getLogger('nxt_roboeyes.eyesd')
+SOCKET_PATH = os.path.join(os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir(), 'nxt_eyesd.sock')
+DIRECTIONS = {'N': N, 'NE': NE, 'E': E, 'SE': SE, 'S': S, 'SW': SW, 'W': W, 'NW': NW, 'CENTER': 0}
+MOOD_NAMES = {v: k for k, v in MOODS.items()}
+# Longest request line accepted from a client
+MAX_LINE = 64 * 1024
+
+
+class CommandError(Exception):
+    pass
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_name(value, table):
+    return isinstance(value, str) and value in table
+
+
+def _remove_stale_socket(path):
+    """Unlink the socket a dead daemon left at `path`; raise if a daemon
+    still answers there"""
+    try:
+        if not stat.S_ISSOCK(os.stat(path).st_mode): return # not ours, bind reports it
+    except FileNotFoundError:
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return
+    finally:
+        probe.close()
+    raise OSError(errno.EADDRINUSE, f"a daemon is already listening on {path}")
+
+
+def look(eyes, direction):
+    """Move the eyes to a screen edge/corner (N..NW) or back to the center"""
+    mx, my = eyes.get_screen_constraint_X(), eyes.get_screen_constraint_Y()
+    x = {N: mx // 2, NE: mx, E: mx, SE: mx, S: mx // 2, SW: 0, W: 0, NW: 0}.get(direction, mx // 2)
+    y = {N: 0, NE: 0, E: my // 2, SE: my, S: my, SW: my, W: my // 2, NW: 0}.get(direction, my // 2)
+    eyes.eyeLxNext, eyes.eyeLyNext = x, y
+
+
+class EyesDaemon:
+    def __init__(self, eyes, max_sleep=RUN_MAX_SLEEP):
+        self.eyes = eyes
+        self.max_sleep = max_sleep
+        self.commands = 0
+        self.clients = 0
+        self._wake = None
+        self._running = False
+        self._servers = []
+
+    # --- Commands ---
+
+    def check(self, cmd, args):
+        """Raise CommandError unless `cmd` would accept `args`; touches nothing"""
+        handler = getattr(self, 'cmd_' + str(cmd), None)
+        if handler is None: raise CommandError(f"unknown command {cmd!r}")
+        try:
+            bound = inspect.signature(handler).bind(**args).arguments
+        except TypeError as e:
+            raise CommandError(f"{cmd}: {e}")
+        if cmd == 'mood' and not _is_name(bound['mood'], MOODS):
+            raise CommandError(f"unknown mood {bound['mood']!r}")
+        if cmd == 'look':
+            direction = bound.get('direction')
+            if direction is not None and not _is_name(direction, DIRECTIONS):
+                raise CommandError(f"unknown direction {direction!r}")
+            for key in ('x', 'y'):
+                if bound.get(key) is not None and not _is_int(bound[key]):
+                    raise CommandError(f"{cmd}: {key} must be an integer")
+        if cmd in ('autoblink', 'idle'):
+            for key in ('interval', 'variation'):
+                value = bound.get(key)
+                if value is not None and not (_is_int(value) and value >= 0):
+                    raise CommandError(f"{cmd}: {key} must be an integer >= 0")
+        if cmd == 'sequence': self._parse_steps(bound['steps'])
+
+    def apply(self, cmd, args):
+        """Run one command on the eyes, returns the reply fields"""
+        self.check(cmd, args)
+        result = getattr(self, 'cmd_' + cmd)(**args)
+        self.commands += 1
+        if self._wake is not None: self._wake.set()
+        return result or {}
+
+    def cmd_ping(self):
+        return {}
+
+    def cmd_mood(self, mood):
+        self.eyes.mood = MOODS[mood]
+
+    def cmd_blink(self, left=None, right=None):
+        self.eyes.blink(left, right)
+
+    def cmd_wink(self, left=None, right=None):
+        if not left and not right: right = True
+        self.eyes.wink(left=left, right=right)
+
+    def cmd_laugh(self):
+        self.eyes.laugh()
+
+    def cmd_confuse(self):
+        self.eyes.confuse()
+
+    def cmd_look(self, direction=None, x=None, y=None):
+        eyes = self.eyes
+        if direction is not None: look(eyes, DIRECTIONS[direction])
+        if x is not None: eyes.eyeLxNext = max(0, min(x, eyes.get_screen_constraint_X()))
+        if y is not None: eyes.eyeLyNext = max(0, min(y, eyes.get_screen_constraint_Y()))
+
+    def cmd_autoblink(self, active=True, interval=None, variation=None):
+        self.eyes.set_auto_blinker(active, interval, variation)
+
+    def cmd_idle(self, active=True, interval=None, variation=None):
+        self.eyes.set_idle_mode(active, interval, variation)
+
+    def cmd_cyclops(self, active=True):
+        self.eyes.set_cyclops(active)
+
+    def _parse_steps(self, steps):
+        """[(ms, cmd, args), ...] of a sequence, every step checked up front"""
+        if not isinstance(steps, (list, tuple)): raise CommandError("sequence steps must be a list")
+        parsed = []
+        for step in steps:
+            try:
+                ms, cmd, args = (list(step) + [{}])[:3]
+                args = dict(args)
+            except (TypeError, ValueError):
+                raise CommandError(f"bad sequence step {step!r}")
+            if not _is_int(ms) or ms < 0: raise CommandError(f"bad sequence step {step!r}: ms must be an integer >= 0")
+            if cmd in ('sequence', 'status') or not hasattr(self, 'cmd_' + str(cmd)):
+                raise CommandError(f"command {cmd!r} can't be sequenced")
+            self.check(cmd, args)
+            parsed.append((ms, cmd, args))
+        return parsed
+
+    def _run_step(self, cmd, args):
+        # Runs inside the animation loop: a failing step must not stop it
+        try:
+            self.apply(cmd, args)
+        except Exception:
+            log.exception("sequence step %s %r failed", cmd, args)
+
+    def cmd_sequence(self, steps, name='eyesd'):
+        """steps: [[ms, cmd, {args}], ...] relative to now, replaces a
+        running sequence of the same name"""
+        parsed = self._parse_steps(steps)
+        seqs = self.eyes.sequences
+        seq = next((s for s in seqs if s.name == name), None) or seqs.add(name)
+        seq.reset()
+        seq.clear()
+        for ms, cmd, args in parsed:
+            seq.step(ms, lambda eyes, cmd=cmd, args=args: self._run_step(cmd, args))
+        seq.start()
+
+    def cmd_status(self):
+        eyes = self.eyes
+        return {'mood': MOOD_NAMES.get(eyes.mood, eyes.mood), 'fps': round(1000 / eyes.frameInterval, 1),
+                'commands': self.commands, 'clients': self.clients, 'stats': eyes.stats()}
+
+    # --- Socket API ---
+
+    async def _client(self, reader, writer):
+        self.clients += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    break # line too long
+                if not line: break
+                reply = self._handle(line)
+                writer.write(json.dumps(reply, separators=(',', ':')).encode('utf-8') + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.clients -= 1
+            writer.close()
+
+    def _handle(self, line):
+        req_id = None
+        try:
+            req = json.loads(line)
+            if not isinstance(req, dict): raise CommandError("request must be a JSON object")
+            req_id = req.pop('id', None)
+            reply = {'ok': True}
+            reply.update(self.apply(req.pop('cmd', None), req))
+        except (ValueError, CommandError) as e:
+            reply = {'ok': False, 'error': str(e)}
+        if req_id is not None: reply['id'] = req_id
+        return reply
+
+    async def start(self, path=None, host=None, port=None):
+        """Listen on a Unix socket and/or TCP (host, port)"""
+        if path:
+            _remove_stale_socket(path)
+            self._servers.append(await asyncio.start_unix_server(self._client, path, limit=MAX_LINE))
+        if port is not None:
+            self._servers.append(await asyncio.start_server(self._client, host or '127.0.0.1', port, limit=MAX_LINE))
+        if not self._servers: raise ValueError("need a socket path or a TCP port")
+
+    async def run(self):
+        """Animation loop: sleeps until the next frame is due or a command arrives"""
+        eyes = self.eyes
+        self._wake = asyncio.Event()
+        self._running = True
+        while self._running:
+            try:
+                eyes._tick()
+            except Exception:
+                log.exception("frame failed")
+            delay = eyes._sleep_time(self.max_sleep)
+            if delay > 0:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    def stop(self):
+        self._running = False
+        for server in self._servers: server.close()
+        if self._wake is not None: self._wake.set()
+
+
+class EyesClient:
+    """Blocking client: EyesClient().call('mood', mood='HAPPY')"""
+    def __init__(self, path=SOCKET_PATH, host=None, port=None, timeout=5.0):
+        if port is not None:
+            self.sock = socket.create_connection((host or '127.0.0.1', port), timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(path)
+        self._file = self.sock.makefile('rb')
+        self._id = 0
+
+    def call(self, cmd, **args):
+        """Send a command, returns the reply dict. Raises CommandError on errors"""
+        self._id += 1
+        self.sock.sendall(json.dumps(dict(args, cmd=cmd, id=self._id)).encode('utf-8') + b'\n')
+        line = self._file.readline()
+        if not line: raise ConnectionError("daemon closed the connection")
+        reply = json.loads(line)
+        if not reply.get('ok'): raise CommandError(reply.get('error'))
+        return reply
+
+    def close(self):
+        self._file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- CLI ---
+
+def _open_display(mock):
+    if mock:
+        return NxtDisplay(MockBrick('usb', sleep=True), async_transport=True), None
+    from nxt_connect import ConnectionManager
+    brick = ConnectionManager().connect(reconnect=True)
+    disp = NxtDisplay(brick, async_transport=True)
+    brick.attach(disp)
+    disp.enable_pipelining()
+    return disp, brick
+
+async def _serve(args):
+    disp, brick = _open_display(args.mock)
+    eyes = RoboEyes(disp, SCREEN_W, SCREEN_H, frame_rate=args.fps, on_show=lambda e: e.fb.update())
+    eyes.set_tweening(TWEEN_TIME)
+    eyes.enable_adaptive_framerate(max_fps=args.fps)
+    eyes.set_auto_blinker(True, 3, 2)
+    eyes.enable_stats()
+    daemon = EyesDaemon(eyes)
+    host, port = None, None
+    if args.tcp:
+        host, _, port = args.tcp.rpartition(':')
+        port = int(port)
+    await daemon.start(None if args.no_unix else args.unix, host, port)
+    print(f"nxt_eyesd listening on {'' if args.no_unix else args.unix} {args.tcp or ''}")
+    try:
+        await daemon.run()
+    finally:
+        disp.clear()
+        disp.update()
+        disp.close()
+        if brick is not None: brick.close()
+
+def _parse_value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+def main():
+    parser = argparse.ArgumentParser(description='RoboEyes daemon with a JSON line socket API.')
+    sub = parser.add_subparsers(dest='action', required=True)
+    p = sub.add_parser('serve')
+    p.add_argument('--unix', default=SOCKET_PATH)
+    p.add_argument('--no-unix', action='store_true')
+    p.add_argument('--tcp', metavar='HOST:PORT')
+    p.add_argument('--fps', type=int, default=20)
+    p.add_argument('--mock', action='store_true', help='MockBrick instead of a real brick')
+    p = sub.add_parser('send')
+    p.add_argument('cmd')
+    p.add_argument('args', nargs='*', metavar='key=value', help='values are JSON, or plain strings')
+    p.add_argument('--unix', default=SOCKET_PATH)
+    p.add_argument('--tcp', metavar='HOST:PORT')
+    args = parser.parse_args()
+
+    if args.action == 'serve':
+        try:
+            asyncio.run(_serve(args))
+        except KeyboardInterrupt:
+            pass
+        return
+    kw = dict(a.split('=', 1) for a in args.args)
+    host, port = None, None
+    if args.tcp:
+        host, _, port = args.tcp.rpartition(':')
+        port = int(port)
+    with EyesClient(args.unix, host, port) as client:
+        print(json.dumps(client.call(args.cmd, **{k: _parse_value(v) for k, v in kw.items()})))
+
+if __name__ == "__main__":
+    main()
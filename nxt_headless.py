@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Headless RoboEyes: render expressions without a brick, faster than real time.
+
+The animation runs on a simulated clock that advances by exactly one
+frame interval per step, so blinks, laughs and idle moves keep their
+timing while frames come out as fast as the CPU allows.
+
+    eyes, clock = headless_eyes(frame_rate=20)
+    eyes.mood = HAPPY
+    for t_ms, frame in render_frames(eyes, clock, duration_ms=3000):
+        ...                                  # 800 bytes, NXT page layout
+
+    python nxt_headless.py --mood HAPPY --seconds 5 --format png --out frames/eye_%04d.png
+    python nxt_headless.py --mood ANGRY --seconds 5 --format raw --out angry.raw
+"""
+import argparse
+import os
+import random
+import struct
+import zlib
+
+from nxt_roboeyes import NxtDisplay, RoboEyes, SCREEN_W, SCREEN_H, BUFFER_SIZE, \
+    DEFAULT, TIRED, ANGRY, HAPPY, FROZEN, SCARY, CURIOUS
+
+MOODS = {'DEFAULT': DEFAULT, 'TIRED': TIRED, 'ANGRY': ANGRY, 'HAPPY': HAPPY,
+         'FROZEN': FROZEN, 'SCARY': SCARY, 'CURIOUS': CURIOUS}
+
+
+class SimClock:
+    """Millisecond clock that only moves when told to (RoboEyes(clock=...))"""
+    def __init__(self, start_ms=0):
+        self.ms = start_ms
+
+    def __call__(self):
+        return self.ms
+
+    def advance(self, ms):
+        self.ms += ms
+
+
+def headless_eyes(frame_rate=20, display=None, **kw):
+    """RoboEyes on a brick-less display, driven by a SimClock"""
+    clock = SimClock()
+    fb = display if display is not None else NxtDisplay(None)
+    eyes = RoboEyes(fb, SCREEN_W, SCREEN_H, frame_rate=frame_rate, clock=clock, **kw)
+    return eyes, clock
+
+
+def render_frames(eyes, clock, duration_ms=None, count=None):
+    """Generator of (t_ms, frame_bytes), one per simulated frame.
+
+    Stops after duration_ms of animation time or count frames, runs
+    forever when neither is given. Frames are not kept in memory.
+    """
+    start = clock()
+    n = 0
+    while (count is None or n < count) and (duration_ms is None or clock() - start < duration_ms):
+        clock.advance(eyes.frameInterval)
+        eyes.update()
+        n += 1
+        yield clock() - start, eyes.fb.get_frame()
+
+
+# --- Frame conversion / writers ---
+
+def frame_rows(frame):
+    """Page-layout frame -> list of SCREEN_H rows of 0/1 pixel values"""
+    rows = []
+    for y in range(SCREEN_H):
+        base = (y >> 3) * SCREEN_W
+        shift = y & 7
+        rows.append(bytes((frame[base + x] >> shift) & 1 for x in range(SCREEN_W)))
+    return rows
+
+
+def _pack_row(row, invert=False):
+    """0/1 pixels -> bytes, 8 pixels per byte, MSB first (PBM/PNG order)"""
+    out = bytearray((len(row) + 7) // 8)
+    for x, v in enumerate(row):
+        if v != invert: out[x >> 3] |= 0x80 >> (x & 7)
+    return bytes(out)
+
+
+def to_pbm(frame):
+    """Binary PBM (P4), set pixels are black like on the NXT LCD"""
+    return b'P4\n%d %d\n' % (SCREEN_W, SCREEN_H) + b''.join(_pack_row(r) for r in frame_rows(frame))
+
+
+def to_png(frame):
+    """1-bit grayscale PNG (no dependencies), set pixels are black"""
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xFFFFFFFF)
+    raw = b''.join(b'\x00' + _pack_row(r, invert=True) for r in frame_rows(frame))
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', SCREEN_W, SCREEN_H, 1, 0, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw, 9))
+            + chunk(b'IEND', b''))
+
+
+def export(frames, out, fmt='png'):
+    """Write a (t_ms, frame) stream to disk, returns the number of frames.
+
+    pbm/png: `out` is a pattern with one %d for the frame number.
+    raw: `out` is a single file of concatenated 800-byte frames.
+    """
+    n = 0
+    if fmt == 'raw':
+        with open(out, 'wb') as f:
+            for _, frame in frames:
+                f.write(frame)
+                n += 1
+        return n
+    encode = {'pbm': to_pbm, 'png': to_png}[fmt]
+    folder = os.path.dirname(out % 0)
+    if folder: os.makedirs(folder, exist_ok=True)
+    for _, frame in frames:
+        with open(out % n, 'wb') as f:
+            f.write(encode(frame))
+        n += 1
+    return n
+
+
+def read_raw(path):
+    """Generator of frames from a raw packed file written by export()"""
+    with open(path, 'rb') as f:
+        while True:
+            frame = f.read(BUFFER_SIZE)
+            if len(frame) < BUFFER_SIZE: return
+            yield frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render RoboEyes frames without a brick.')
+    parser.add_argument('--mood', choices=sorted(MOODS), default='DEFAULT')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--fps', type=int, default=20)
+    parser.add_argument('--format', choices=('png', 'pbm', 'raw'), default='png')
+    parser.add_argument('--out', default='frames/eye_%04d.png')
+    parser.add_argument('--seed', type=int, default=None, help='random seed for blink/idle timing')
+    parser.add_argument('--no-blink', action='store_true')
+    parser.add_argument('--idle', action='store_true')
+    parser.add_argument('--cyclops', action='store_true')
+    args = parser.parse_args()
+
+    if args.seed is not None: random.seed(args.seed)
+    eyes, clock = headless_eyes(frame_rate=args.fps)
+    eyes.set_cyclops(args.cyclops)
+    eyes.mood = MOODS[args.mood]
+    eyes.set_auto_blinker(not args.no_blink)
+    eyes.set_idle_mode(args.idle)
+
+    n = export(render_frames(eyes, clock, duration_ms=args.seconds * 1000), args.out, args.format)
+    print(f"Wrote {n} frames to {args.out}")
+
+if __name__ == "__main__":
+    main()
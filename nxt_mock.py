@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Fake NXT brick for running the display pipeline without hardware.
+
+MockBrick implements write_io_map/read_io_map (and the no-reply write
+used by pipelining) on an in-memory IOMap and charges every call to a
+simulated link clock, so benchmarks, replays and the daemon's --mock
+mode run fast and repeatably:
+
+    brick = MockBrick('rfcomm')
+    disp = NxtDisplay(brick)
+    ...
+    print(brick.calls, brick.bytes, brick.link_ms, brick.screen == disp.get_frame())
+"""
+import time
+
+from nxt_roboeyes import BUFFER_SIZE, DISPLAY_OFFSET
+
+# Rough round-trip models of the two links: (ms per call, ms per byte)
+LATENCY_MODELS = {
+    'none':   (0.0, 0.0),
+    'usb':    (3.0, 0.002),   # pyusb bulk transfer + reply
+    'rfcomm': (30.0, 0.05),   # BT direction switch dominates
+}
+
+# A no-reply write skips the reply, it costs this share of a call's latency
+NOREPLY_CALL_SHARE = 0.15
+# Largest IOMap write of a 64 byte USB telegram
+USB_MAX_PAYLOAD = 54
+
+
+class MockBrick:
+    """Fake NXT brick that accounts for link time instead of sleeping.
+
+    With sleep=True the simulated latency is also spent in time.sleep,
+    which is useful to exercise the threaded transport for real.
+    """
+    def __init__(self, latency='none', sleep=False, max_payload=None):
+        self.per_call, self.per_byte = LATENCY_MODELS[latency] if isinstance(latency, str) else latency
+        self.sleep = sleep
+        # Longer IOMap writes are rejected (None = any size)
+        self.max_payload = max_payload
+        self.iomap = bytearray(DISPLAY_OFFSET + BUFFER_SIZE)
+        self.calls = 0
+        self.noreply_calls = 0
+        self.bytes = 0
+        self.link_ms = 0.0
+
+    def _charge(self, size, share=1.0):
+        ms = self.per_call * share + self.per_byte * size
+        self.calls += 1
+        self.bytes += size
+        self.link_ms += ms
+        if self.sleep and ms: time.sleep(ms / 1000)
+
+    def write_io_map(self, mod_id, offset, data):
+        self._charge(len(data))
+        if self.max_payload is not None and len(data) > self.max_payload: raise ValueError("telegram too long")
+        self.iomap[offset:offset + len(data)] = data
+        return mod_id, len(data)
+
+    def write_io_map_noreply(self, mod_id, offset, data):
+        self._charge(len(data), NOREPLY_CALL_SHARE)
+        self.noreply_calls += 1
+        if self.max_payload is not None and len(data) > self.max_payload: return
+        self.iomap[offset:offset + len(data)] = data
+
+    def read_io_map(self, mod_id, offset, size):
+        self._charge(size)
+        return mod_id, bytes(self.iomap[offset:offset + size])
+
+    @property
+    def screen(self):
+        """What the brick currently displays"""
+        return bytes(self.iomap[DISPLAY_OFFSET:DISPLAY_OFFSET + BUFFER_SIZE])
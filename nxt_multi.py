@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Drive the displays of several NXT bricks from one process.
+
+Every brick gets its own NxtDisplay with a TransportWorker thread, so a
+slow Bluetooth link only drops its own frames (latest frame wins) and
+never holds back the render loop or the other links. All RoboEyes share
+one FrameCache: robots showing the same state render that frame once.
+
+    multi = MultiDisplay(frame_rate=20)
+    multi.add('left', usb_brick)
+    multi.add('right', bt_brick, adaptive=True)   # own rate for the slow link
+    multi['right'].mood = HAPPY
+    multi.run()                                   # or await multi.run_async()
+    print(multi.stats())
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+from nxt_roboeyes import NxtDisplay, RoboEyes, FrameCache, FrameStats, SCREEN_W, SCREEN_H, \
+    STATS_WINDOW, FRAME_CACHE_SIZE, RUN_MAX_SLEEP
+
+
+class LinkStats(FrameStats):
+    """FrameStats of one link's transport thread, with delivery times for
+    the achieved frame rate"""
+    def __init__(self, window=STATS_WINDOW):
+        super().__init__(window)
+        self.delivered = deque(maxlen=window)
+
+    def add_transport(self, ms, calls, nbytes, error=False):
+        super().add_transport(ms, calls, nbytes, error)
+        self.delivered.append(time.monotonic())
+
+    def fps(self):
+        d = self.delivered
+        span = d[-1] - d[0] if len(d) > 1 else 0
+        return (len(d) - 1) / span if span else 0.0
+
+
+class Link:
+    __slots__ = ('name', 'brick', 'display', 'eyes', 'stats')
+
+    def __init__(self, name, brick, display, eyes, stats):
+        self.name = name
+        self.brick = brick
+        self.display = display
+        self.eyes = eyes
+        self.stats = stats
+
+
+class MultiDisplay:
+    def __init__(self, frame_rate=20, cache_size=FRAME_CACHE_SIZE * 4, **eyes_kw):
+        self.frame_rate = frame_rate
+        self.eyes_kw = eyes_kw
+        self.frame_cache = FrameCache(cache_size)
+        self.links = OrderedDict()
+        self._running = False
+
+    def add(self, name, brick, adaptive=False, **kw):
+        """Add a brick (USB or Bluetooth, anything with write_io_map) and
+        return its RoboEyes. adaptive=True lets the link's measured speed
+        pick that robot's frame rate."""
+        if name in self.links: raise ValueError(f"link {name!r} already added")
+        disp = NxtDisplay(brick, async_transport=True, transport_name=f'nxt-display-{name}')
+        if disp.transport is None: raise RuntimeError(f"brick {name!r} has no write_io_map")
+        stats = disp.frame_stats = LinkStats()
+        opts = dict(self.eyes_kw, **kw)
+        opts.setdefault('frame_rate', self.frame_rate)
+        eyes = RoboEyes(disp, SCREEN_W, SCREEN_H, on_show=lambda e: e.fb.update(),
+                        frame_cache=self.frame_cache, **opts)
+        if adaptive: eyes.enable_adaptive_framerate()
+        self.links[name] = Link(name, brick, disp, eyes, stats)
+        return eyes
+
+    def remove(self, name, timeout=None):
+        """Detach a brick after its last frame was delivered"""
+        self.links.pop(name).display.close(timeout)
+
+    def __getitem__(self, name):
+        return self.links[name].eyes
+
+    def __iter__(self):
+        return iter(self.links)
+
+    def __len__(self):
+        return len(self.links)
+
+    # --- Run loops ---
+
+    def tick(self):
+        """Update every robot whose next frame is due"""
+        for link in list(self.links.values()):
+            link.eyes._tick()
+
+    def next_deadline(self):
+        """Earliest RoboEyes.next_deadline() of all robots, None = all at rest"""
+        deadlines = [d for d in (link.eyes.next_deadline() for link in self.links.values()) if d is not None]
+        return min(deadlines) if deadlines else None
+
+    def _sleep_time(self, max_sleep):
+        deadline = self.next_deadline()
+        if deadline is None or not self.links: return max_sleep
+        clock = next(iter(self.links.values())).eyes.clock
+        return min((deadline - clock()) / 1000, max_sleep)
+
+    def run(self, on_tick=None, max_sleep=RUN_MAX_SLEEP):
+        """Blocking loop for all robots, see RoboEyes.run(). on_tick(multi)"""
+        self._running = True
+        while self._running:
+            self.tick()
+            if on_tick: on_tick(self)
+            delay = self._sleep_time(max_sleep)
+            if delay > 0: time.sleep(delay)
+
+    async def run_async(self, on_tick=None, max_sleep=RUN_MAX_SLEEP):
+        self._running = True
+        while self._running:
+            self.tick()
+            if on_tick:
+                res = on_tick(self)
+                if asyncio.iscoroutine(res): await res
+            delay = self._sleep_time(max_sleep)
+            await asyncio.sleep(delay if delay > 0 else 0)
+
+    def stop(self):
+        self._running = False
+
+    def flush(self, timeout=None):
+        """Wait until every link delivered its last frame. False on timeout"""
+        return all([link.display.flush(timeout) for link in self.links.values()])
+
+    def close(self, timeout=None):
+        for link in self.links.values(): link.display.close(timeout)
+
+    # --- Statistics ---
+
+    def stats(self):
+        """Per brick: delivered fps, link latency (ms per frame write),
+        errors and frame counters; plus the shared frame cache"""
+        report = {}
+        for name, link in self.links.items():
+            st = link.stats
+            transport = link.display.transport
+            latency = FrameStats._summary(st.samples['transport'])
+            report[name] = {
+                'fps': st.fps(),
+                'target_fps': 1000 / link.eyes.frameInterval,
+                'latency_ms': {k: latency[k] for k in ('mean', 'p50', 'p90', 'max')},
+                'bytes_per_frame': sum(st.bytes) / len(st.bytes) if st.bytes else 0.0,
+                'errors': link.display.transport_errors,
+                'frames_sent': transport.frames_sent if transport else 0,
+                'frames_dropped': transport.frames_dropped if transport else 0,
+                'bytes_sent': link.display.bytes_sent,
+            }
+        report['cache'] = {'hits': self.frame_cache.hits, 'misses': self.frame_cache.misses}
+        return report
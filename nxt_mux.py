@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Share one brick link between display, sound and motor commands.
+
+BrickMux owns the brick and performs every call on one worker thread,
+most urgent class first: motor commands, then sound, then anything else,
+display writes last. A display frame is many write_io_map calls, so a
+motor command waits for at most one display chunk instead of a whole
+frame. The display sends through an async NxtDisplay whose mailbox keeps
+only the newest frame, so frames that went stale while motors had the
+link are merged into one.
+
+    mux = BrickMux(brick)
+    disp = mux.display(async_transport=True)   # NxtDisplay for RoboEyes
+    motor = nxt.motor.Motor(mux.brick, nxt.motor.Port.A)
+    mux.brick.play_tone(440, 200)              # blocking, like the brick
+    fut = mux.submit('sound', 'play_tone', 880, 100)   # concurrent.futures.Future
+    print(mux.stats())
+"""
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from nxt_roboeyes import NxtDisplay, FrameStats, STATS_WINDOW
+
+# Command classes, lower runs first
+PRIORITIES = {'motor': 0, 'sound': 1, 'other': 2, 'display': 3}
+# Brick methods by class, everything else is 'other'
+COMMAND_CLASSES = {
+    'set_output_state': 'motor', 'get_output_state': 'motor', 'reset_motor_position': 'motor',
+    'play_tone': 'sound', 'play_tone_and_wait': 'sound', 'play_sound_file': 'sound', 'stop_sound_playback': 'sound',
+}
+
+
+class ClassMetrics:
+    """Queue depth and latencies (ms) of one command class"""
+    def __init__(self, window=STATS_WINDOW):
+        self.depth = 0
+        self.max_depth = 0
+        self.submitted = 0
+        self.done = 0
+        self.errors = 0
+        self.wait = deque(maxlen=window)    # queued until the link was free
+        self.latency = deque(maxlen=window) # queued until the reply
+
+    def stats(self):
+        return {
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'submitted': self.submitted,
+            'done': self.done,
+            'errors': self.errors,
+            'wait_ms': FrameStats._summary(self.wait),
+            'latency_ms': FrameStats._summary(self.latency),
+        }
+
+
+class MuxBrick:
+    """Brick stand-in whose calls go through the mux. cls=None picks the
+    class from the method name (COMMAND_CLASSES)."""
+    def __init__(self, mux, cls=None):
+        self._mux = mux
+        self._cls = cls
+
+    def __getattr__(self, name):
+        attr = getattr(self._mux.target, name)
+        if not callable(attr): return attr
+        cls = self._cls or COMMAND_CLASSES.get(name, 'other')
+        return lambda *args, **kw: self._mux.submit(cls, name, *args, **kw).result()
+
+
+class BrickMux:
+    def __init__(self, brick, name='nxt-mux'):
+        self.target = brick
+        self.metrics = {cls: ClassMetrics() for cls in PRIORITIES}
+        self._queue = [] # (priority, seq, cls, submitted, method, args, kw, future)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.brick = MuxBrick(self)
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, cls, method, *args, **kw):
+        """Queue brick.method(*args, **kw) in class `cls`, returns a Future"""
+        if cls not in PRIORITIES: raise ValueError(f"unknown command class {cls!r}")
+        fut = Future()
+        with self._cond:
+            if self._closed: raise RuntimeError("mux is closed")
+            m = self.metrics[cls]
+            m.submitted += 1
+            m.depth += 1
+            if m.depth > m.max_depth: m.max_depth = m.depth
+            heapq.heappush(self._queue, (PRIORITIES[cls], next(self._seq), cls, time.perf_counter(), method, args, kw, fut))
+            self._cond.notify()
+        return fut
+
+    def link(self, cls):
+        """Brick stand-in that sends every call in class `cls`"""
+        if cls not in PRIORITIES: raise ValueError(f"unknown command class {cls!r}")
+        return MuxBrick(self, cls)
+
+    def display(self, **kw):
+        """NxtDisplay writing through the mux at display priority"""
+        return NxtDisplay(self.link('display'), **kw)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue: return # closed and drained
+                _, _, cls, submitted, method, args, kw, fut = heapq.heappop(self._queue)
+            m = self.metrics[cls]
+            start = time.perf_counter()
+            if fut.set_running_or_notify_cancel():
+                try:
+                    fut.set_result(getattr(self.target, method)(*args, **kw))
+                except Exception as e:
+                    m.errors += 1
+                    fut.set_exception(e)
+            end = time.perf_counter()
+            with self._cond:
+                m.depth -= 1
+                m.done += 1
+                m.wait.append((start - submitted) * 1000)
+                m.latency.append((end - submitted) * 1000)
+
+    def stats(self):
+        """Per class: current and max queue depth, counters, wait and latency percentiles"""
+        with self._cond:
+            return {cls: m.stats() for cls, m in self.metrics.items()}
+
+    def close(self, timeout=None):
+        """Run what is queued, then stop the worker"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""NumPy-backed drawing surface for RoboEyes.
+
+NumpyDisplay keeps the screen as a 64x100 uint8 canvas (one element per
+pixel) and draws with vectorized mask operations. The canvas is packed
+into the 800-byte NXT page layout (8 vertical pixels per byte, LSB on
+top) only when a frame is taken: update(), get_frame() or `packed`.
+
+It is a drop-in replacement for NxtDisplay:
+
+    disp = NumpyDisplay(brick)
+    eyes = RoboEyes(disp, SCREEN_W, SCREEN_H, on_show=lambda re: re.fb.update())
+
+Pixels are identical to NxtDisplay for every primitive, and clip boxes
+(set_clip) work the same way.
+"""
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from nxt_roboeyes import NxtDisplay, SCREEN_W, SCREEN_H
+
+PAGES = SCREEN_H // 8
+
+
+@lru_cache(maxsize=64)
+def _quarter_disc(r):
+    """Boolean (r+1)x(r+1) mask of dx*dx + dy*dy <= r*r, origin top-left"""
+    d = np.arange(r + 1)
+    return (d[:, None] ** 2 + d[None, :] ** 2) <= r * r
+
+
+def pack_pages(canvas):
+    """64x100 pixel canvas -> 800 bytes in NXT page-column layout"""
+    pages = canvas.reshape(PAGES, 8, SCREEN_W).astype(bool)
+    return np.packbits(pages, axis=1, bitorder='little').tobytes()
+
+
+def unpack_pages(frame):
+    """800 bytes in NXT page-column layout -> 64x100 uint8 canvas"""
+    pages = np.frombuffer(bytes(frame), dtype=np.uint8).reshape(PAGES, 1, SCREEN_W)
+    return np.unpackbits(pages, axis=1, bitorder='little').reshape(SCREEN_H, SCREEN_W)
+
+
+class NumpyDisplay(NxtDisplay):
+    def __init__(self, brick, **kw):
+        if np is None:
+            raise RuntimeError("NumpyDisplay requires numpy (pip install numpy).")
+        super().__init__(brick, **kw)
+        self.canvas = np.zeros((SCREEN_H, SCREEN_W), dtype=np.uint8)
+        self._cols = np.arange(SCREEN_W)
+
+    @property
+    def packed(self):
+        """Current canvas in NXT page layout"""
+        return pack_pages(self.canvas)
+
+    def get_frame(self):
+        return self.packed
+
+    def set_frame(self, frame, dirty=None):
+        self._frame_dirty(dirty)
+        self.canvas[:] = unpack_pages(frame)
+
+    def update(self, force_full=False):
+        # Pack once per flush, the inherited transport sends self.buf
+        self.buf[:] = self.packed
+        super().update(force_full)
+
+    def clear(self):
+        self.fill(0)
+
+    def fill(self, color):
+        if self.clip is None:
+            self.canvas.fill(1 if color else 0)
+            self._dirty = None
+            return
+        x0, y0, x1, y1 = self.clip
+        self.canvas[y0:y1, x0:x1] = 1 if color else 0
+
+    def set_pixel(self, x, y, color):
+        if self.clip is None: self._dirty = None
+        x0, y0, x1, y1 = self._bounds
+        if not (x0 <= x < x1 and y0 <= y < y1):
+            return
+        self.canvas[y, x] = 1 if color else 0
+
+    # --- Drawing Primitives ---
+
+    def fill_rect(self, x, y, w, h, color):
+        if self.clip is None: self._dirty = None
+        cx0, cy0, cx1, cy1 = self._bounds
+        x0, y0 = max(x, cx0), max(y, cy0)
+        x1, y1 = min(x + w, cx1), min(y + h, cy1)
+        if x0 >= x1 or y0 >= y1: return
+        self.canvas[y0:y1, x0:x1] = 1 if color else 0
+
+    def fill_rrect(self, x, y, w, h, r, color):
+        # Same decomposition as NxtDisplay.fill_rrect
+        self.fill_rect(x, y + r, w, h - 2 * r, color)
+        self.fill_rect(x + r, y, w - 2 * r, r, color)
+        self.fill_rect(x + r, y + h - r, w - 2 * r, r, color)
+        self._fill_circle_helper(x + r, y + r, r, 1, color)
+        self._fill_circle_helper(x + w - r - 1, y + r, r, 2, color)
+        self._fill_circle_helper(x + w - r - 1, y + h - r - 1, r, 3, color)
+        self._fill_circle_helper(x + r, y + h - r - 1, r, 4, color)
+
+    def _fill_circle_helper(self, cx, cy, r, corner, color):
+        # corner: 1=TL, 2=TR, 3=BR, 4=BL
+        if r < 0: return
+        mask = _quarter_disc(r) # [dy, dx] for dx, dy >= 0
+        if corner in (1, 4): mask = mask[:, ::-1]
+        if corner in (1, 2): mask = mask[::-1, :]
+        left = cx - r if corner in (1, 4) else cx
+        top = cy - r if corner in (1, 2) else cy
+        self._blit_mask(left, top, mask, color)
+
+    def _blit_mask(self, x, y, mask, color):
+        """Set canvas pixels where mask is true, mask placed at (x, y), clipped"""
+        if self.clip is None: self._dirty = None
+        h, w = mask.shape
+        cx0, cy0, cx1, cy1 = self._bounds
+        x0, y0 = max(x, cx0), max(y, cy0)
+        x1, y1 = min(x + w, cx1), min(y + h, cy1)
+        if x0 >= x1 or y0 >= y1: return
+        region = self.canvas[y0:y1, x0:x1]
+        region[mask[y0 - y:y1 - y, x0 - x:x1 - x]] = 1 if color else 0
+
+    def fill_triangle(self, x0, y0, x1, y1, x2, y2, color):
+        # Sort coordinates by Y
+        if y0 > y1: x0, y0, x1, y1 = x1, y1, x0, y0
+        if y0 > y2: x0, y0, x2, y2 = x2, y2, x0, y0
+        if y1 > y2: x1, y1, x2, y2 = x2, y2, x1, y1
+
+        total_height = y2 - y0
+        if total_height == 0: return # Flat triangle
+        if self.clip is None: self._dirty = None
+        cx0, cy0, cx1, cy1 = self._bounds
+
+        # All scanlines at once, with the same float arithmetic as the
+        # scalar rasterizer so truncation gives identical spans
+        i = np.arange(total_height)
+        y = y0 + i
+        second_half = (i > y1 - y0) | (y1 == y0)
+        segment_height = np.where(second_half, y2 - y1, y1 - y0)
+        keep = (y >= cy0) & (y < cy1) & (segment_height != 0)
+        if not keep.any(): return
+        i, y, second_half, segment_height = i[keep], y[keep], second_half[keep], segment_height[keep]
+
+        alpha = i / total_height
+        beta = np.where(second_half, i - (y1 - y0), i) / segment_height
+        ax = np.trunc(x0 + (x2 - x0) * alpha).astype(int)
+        bx = np.where(second_half, np.trunc(x1 + (x2 - x1) * beta), np.trunc(x0 + (x1 - x0) * beta)).astype(int)
+        lo, hi = np.minimum(ax, bx), np.maximum(ax, bx)
+
+        spans = (self._cols >= np.maximum(lo, cx0)[:, None]) & (self._cols <= np.minimum(hi, cx1 - 1)[:, None])
+        rows = self.canvas[y]
+        rows[spans] = 1 if color else 0
+        self.canvas[y] = rows
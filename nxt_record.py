@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""Record and replay the frame stream NxtDisplay sends to the brick.
+
+A Recorder hooked into NxtDisplay gets every frame _send() writes,
+together with the bytes and write_io_map calls it cost on the wire:
+
+    disp.recorder = Recorder('session.nxr')
+    ...
+    disp.recorder.close()
+
+File format: MAGIC, version byte, then one record per frame
+
+    varint  dt      ms since the previous record
+    byte    flags   FLAG_KEY: payload is the frame itself, otherwise the
+                    XOR with the previous frame; FLAG_ERROR: the send failed
+    varint  wire bytes, varint wire calls
+    varint  payload length, payload (RLE, see rle_encode)
+
+Deltas of an animation are mostly zero bytes and a resting frame costs a
+few bytes, so hours of a session fit in a few MB. A keyframe every
+KEYFRAME_EVERY frames lets readers start in the middle of a long
+recording (read_records(start_ms=...)) without decoding all of it. A
+truncated last record (recorder killed) is ignored.
+
+    python nxt_record.py record eyes.nxr --mood HAPPY --seconds 30
+    python nxt_record.py stats eyes.nxr
+    python nxt_record.py export eyes.nxr --format png --out frames/eye_%04d.png
+    python nxt_record.py replay eyes.nxr --mock rfcomm --fast
+"""
+import argparse
+import re
+import threading
+import time
+
+from nxt_roboeyes import NxtDisplay, BUFFER_SIZE
+from nxt_headless import MOODS, headless_eyes, render_frames, export
+from nxt_mock import MockBrick
+
+MAGIC = b'NXTR'
+FORMAT_VERSION = 1
+FLAG_KEY = 1
+FLAG_ERROR = 2
+KEYFRAME_EVERY = 300
+
+_NONZERO = re.compile(rb'[^\x00]+')
+# Runs worth a repeat token: 4+ equal bytes
+_REPEAT = re.compile(rb'(.)\1{3,}', re.S)
+
+
+# --- Encoding ---
+
+def _put_varint(out, n):
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+def _get_varint(data, pos):
+    n = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80: return n, pos
+        shift += 7
+
+def _xor(a, b):
+    return (int.from_bytes(a, 'little') ^ int.from_bytes(b, 'little')).to_bytes(BUFFER_SIZE, 'little')
+
+def rle_encode(data):
+    """Zero-run RLE: tokens of (varint zeros to skip, varint header, data).
+    header = length << 1 | 1 for `length` copies of one byte, length << 1
+    for `length` literal bytes. Trailing zeros are implied."""
+    out = bytearray()
+    pos = 0
+    for span in _NONZERO.finditer(data):
+        start, end = span.span()
+        for run in _REPEAT.finditer(data, start, end):
+            a, b = run.span()
+            if a > start:
+                _put_varint(out, start - pos)
+                _put_varint(out, (a - start) << 1)
+                out += data[start:a]
+                pos = start = a
+            _put_varint(out, start - pos)
+            _put_varint(out, (b - a) << 1 | 1)
+            out.append(data[a])
+            pos = start = b
+        if end > start:
+            _put_varint(out, start - pos)
+            _put_varint(out, (end - start) << 1)
+            out += data[start:end]
+            pos = end
+    return bytes(out)
+
+def rle_decode(payload, size=BUFFER_SIZE):
+    out = bytearray(size)
+    i = pos = 0
+    while i < len(payload):
+        skip, i = _get_varint(payload, i)
+        header, i = _get_varint(payload, i)
+        pos += skip
+        n = header >> 1
+        if header & 1:
+            out[pos:pos + n] = payload[i:i + 1] * n
+            i += 1
+        else:
+            out[pos:pos + n] = payload[i:i + n]
+            i += n
+        pos += n
+    if len(out) != size: raise ValueError("corrupt RLE payload")
+    return bytes(out)
+
+
+# --- Recording ---
+
+class Recorder:
+    """Appends frames to a recording. `f` is a path or a binary file,
+    `clock` returns milliseconds (defaults to the monotonic clock)."""
+    def __init__(self, f, keyframe_every=KEYFRAME_EVERY, clock=None):
+        if isinstance(f, (str, bytes)) or hasattr(f, '__fspath__'):
+            f = open(f, 'wb')
+        self.file = f
+        self.keyframe_every = keyframe_every
+        self.clock = clock or (lambda: time.monotonic() * 1000)
+        self.frames = 0
+        self.bytes_written = 0
+        self._prev = None
+        self._t = None
+        self._lock = threading.Lock() # add() runs on the transport thread
+        self._write(MAGIC + bytes((FORMAT_VERSION,)))
+
+    def _write(self, data):
+        self.file.write(data)
+        self.bytes_written += len(data)
+
+    def add(self, frame, sent=0, calls=0, error=False):
+        """Record one frame as sent: `sent` bytes in `calls` writes"""
+        with self._lock:
+            if self.file is None: return
+            now = int(self.clock())
+            dt = 0 if self._t is None else max(now - self._t, 0)
+            self._t = now
+            key = self._prev is None or self.frames % self.keyframe_every == 0
+            payload = rle_encode(frame if key else _xor(frame, self._prev))
+            self._prev = frame
+            out = bytearray()
+            _put_varint(out, dt)
+            out.append((FLAG_KEY if key else 0) | (FLAG_ERROR if error else 0))
+            _put_varint(out, sent)
+            _put_varint(out, calls)
+            _put_varint(out, len(payload))
+            self._write(bytes(out) + payload)
+            self.frames += 1
+
+    def close(self):
+        with self._lock:
+            if self.file is None: return
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- Reading ---
+
+class Record:
+    __slots__ = ('t_ms', 'frame', 'wire_bytes', 'calls', 'flags', 'size')
+
+    def __init__(self, t_ms, frame, wire_bytes, calls, flags, size):
+        self.t_ms = t_ms             # since the first frame
+        self.frame = frame           # 800 bytes, NXT page layout
+        self.wire_bytes = wire_bytes # what update() put on the link
+        self.calls = calls
+        self.flags = flags
+        self.size = size             # bytes of this record in the file
+
+def _read_varint(f):
+    n = shift = 0
+    while True:
+        c = f.read(1)
+        if not c: raise EOFError
+        n |= (c[0] & 0x7F) << shift
+        if c[0] < 0x80: return n
+        shift += 7
+
+def _read_header(f):
+    """(dt, flags, sent, calls, payload length) of the next record, None at
+    the end of the file or of a truncated header"""
+    try:
+        dt = _read_varint(f)
+        flags = f.read(1)
+        if not flags: return None
+        return dt, flags[0], _read_varint(f), _read_varint(f), _read_varint(f)
+    except EOFError:
+        return None
+
+def _keyframe_before(f, start_ms):
+    """(offset, t_ms before it) of the last keyframe at or before start_ms,
+    found by reading record headers only"""
+    found = (f.tell(), 0)
+    t = 0
+    while True:
+        pos = f.tell()
+        head = _read_header(f)
+        if head is None: return found
+        dt, flags, _, _, n = head
+        if t + dt > start_ms: return found
+        if flags & FLAG_KEY: found = (pos, t)
+        t += dt
+        f.seek(n, 1)
+
+def read_records(path, start_ms=0):
+    """Generator of Record from start_ms on; decoding starts at the last
+    keyframe before it. Records are read from the file one at a time."""
+    with open(path, 'rb') as f:
+        head = f.read(len(MAGIC) + 1)
+        if head[:len(MAGIC)] != MAGIC or len(head) <= len(MAGIC): raise ValueError(f"{path}: not a frame recording")
+        if head[len(MAGIC)] != FORMAT_VERSION: raise ValueError(f"{path}: unsupported version {head[len(MAGIC)]}")
+        t = 0
+        if start_ms > 0:
+            pos, t = _keyframe_before(f, start_ms)
+            f.seek(pos)
+        prev = None
+        while True:
+            start = f.tell()
+            head = _read_header(f)
+            if head is None: return
+            dt, flags, sent, calls, n = head
+            payload = f.read(n)
+            if len(payload) < n: return # truncated last record
+            t += dt
+            delta = rle_decode(payload)
+            if flags & FLAG_KEY: frame = delta
+            elif prev is None: continue # no keyframe yet
+            else: frame = _xor(prev, delta)
+            prev = frame
+            if t >= start_ms: yield Record(t, frame, sent, calls, flags, f.tell() - start)
+
+def frames(path):
+    """(t_ms, frame) pairs, the stream nxt_headless.export() takes"""
+    for rec in read_records(path):
+        yield rec.t_ms, rec.frame
+
+def recording_stats(path):
+    n = keys = errors = wire = calls = size = 0
+    unique = set()
+    t = 0
+    for rec in read_records(path):
+        n += 1
+        keys += bool(rec.flags & FLAG_KEY)
+        errors += bool(rec.flags & FLAG_ERROR)
+        wire += rec.wire_bytes
+        calls += rec.calls
+        size += rec.size
+        unique.add(rec.frame)
+        t = rec.t_ms
+    size += len(MAGIC) + 1
+    per = max(n, 1)
+    return {
+        'frames': n,
+        'unique_frames': len(unique),
+        'keyframes': keys,
+        'errors': errors,
+        'duration_s': t / 1000,
+        'file_bytes': size,
+        'file_bytes_per_frame': size / per,
+        'wire_bytes': wire,
+        'wire_bytes_per_frame': wire / per,
+        'wire_calls_per_frame': calls / per,
+        'raw_bytes': n * BUFFER_SIZE,
+        'compression': n * BUFFER_SIZE / size,
+    }
+
+
+# --- Replay ---
+
+def replay(path, target, realtime=True, speed=1.0, sleep=time.sleep):
+    """Play a recording into `target`: a brick (anything with
+    write_io_map, frames go through NxtDisplay's delta transport) or a
+    callable(t_ms, frame). realtime=False plays as fast as possible.
+    Returns the display (or None) so link counters can be inspected."""
+    disp = None
+    if hasattr(target, 'write_io_map'):
+        disp = NxtDisplay(target)
+        def show(t_ms, frame):
+            disp.set_frame(frame)
+            disp.update()
+    else:
+        show = target
+    start = time.monotonic()
+    for t_ms, frame in frames(path):
+        if realtime:
+            wait = start + t_ms / 1000 / speed - time.monotonic()
+            if wait > 0: sleep(wait)
+        show(t_ms, frame)
+    return disp
+
+
+# --- CLI ---
+
+def _record(args):
+    disp = NxtDisplay(MockBrick(args.latency))
+    eyes, clock = headless_eyes(frame_rate=args.fps, display=disp, on_show=lambda e: e.fb.update())
+    eyes.mood = MOODS[args.mood]
+    eyes.set_auto_blinker(True)
+    eyes.set_idle_mode(args.idle)
+    with Recorder(args.file, clock=clock) as rec:
+        disp.recorder = rec
+        for _ in render_frames(eyes, clock, duration_ms=args.seconds * 1000): pass
+    print(f"Recorded {rec.frames} frames, {rec.bytes_written} bytes to {args.file}")
+
+def _stats(args):
+    for name, value in recording_stats(args.file).items():
+        print(f"{name:22} {value:.2f}" if isinstance(value, float) else f"{name:22} {value}")
+
+def _export(args):
+    n = export(frames(args.file), args.out, args.format)
+    print(f"Wrote {n} frames to {args.out}")
+
+def _replay(args):
+    if args.mock:
+        brick = MockBrick(args.mock)
+        disp = replay(args.file, brick, realtime=not args.fast, speed=args.speed)
+        print(f"{disp.bytes_sent} bytes in {brick.calls} calls, {brick.link_ms:.0f} ms simulated link time")
+        return
+    import nxt.locator
+    with nxt.locator.find() as brick:
+        disp = replay(args.file, brick, realtime=not args.fast, speed=args.speed)
+        print(f"{disp.bytes_sent} bytes sent, {disp.transport_errors} errors")
+
+def main():
+    parser = argparse.ArgumentParser(description='Record, inspect and replay NXT display frame streams.')
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p = sub.add_parser('record', help='record a headless RoboEyes session')
+    p.add_argument('file')
+    p.add_argument('--mood', choices=sorted(MOODS), default='DEFAULT')
+    p.add_argument('--seconds', type=float, default=10)
+    p.add_argument('--fps', type=int, default=20)
+    p.add_argument('--idle', action='store_true')
+    p.add_argument('--latency', choices=('none', 'usb', 'rfcomm'), default='usb')
+    p.set_defaults(func=_record)
+    p = sub.add_parser('stats', help='print bytes per frame, unique frames, compression')
+    p.add_argument('file')
+    p.set_defaults(func=_stats)
+    p = sub.add_parser('export', help='write the frames as images (see nxt_headless)')
+    p.add_argument('file')
+    p.add_argument('--format', choices=('png', 'pbm', 'raw'), default='png')
+    p.add_argument('--out', default='frames/eye_%04d.png')
+    p.set_defaults(func=_export)
+    p = sub.add_parser('replay', help='play a recording on a brick or a mock brick')
+    p.add_argument('file')
+    p.add_argument('--mock', choices=('none', 'usb', 'rfcomm'), help='replay on a MockBrick instead of a real brick')
+    p.add_argument('--fast', action='store_true', help='as fast as possible instead of original speed')
+    p.add_argument('--speed', type=float, default=1.0)
+    p.set_defaults(func=_replay)
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
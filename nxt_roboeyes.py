@@ -2,6 +2,15 @@
 import time
 import math
 import random
+import asyncio
+import logging
+import heapq
+import threading
+from collections import OrderedDict, deque
+from functools import lru_cache
+from operator import attrgetter
+
+log = logging.getLogger('nxt_roboeyes')
 
 # --- NXT Display Driver ---
 SCREEN_W = 100
@@ -9,26 +18,437 @@ SCREEN_H = 64
 BUFFER_SIZE = 800  
 MOD_DISPLAY = 0xA0001
 DISPLAY_OFFSET = 119 
+CHUNK_SIZE = 40   # bytes per write_io_map call
+MERGE_GAP = 16    # changed runs closer than this are sent as one write
+# Pipelined transport (NxtDisplay.enable_pipelining): IOMap writes sent
+# without a reply between two reply barriers, and consecutive failed
+# frames before falling back to one reply per write
+PIPELINE_WINDOW = 4
+PIPELINE_MAX_FAILURES = 3
+# Telegram bytes of an IOMap write besides the data: type, opcode,
+# module (u32), offset (u16), size (u16)
+IOMAP_WRITE_HEADER = 10
+
+def _changed_runs(new, old, gap, spans=None):
+    """List of [start, end) byte ranges where new differs from old.
+    Runs separated by at most `gap` unchanged bytes are merged. spans
+    (sorted, disjoint byte ranges) limits the compare, default everything."""
+    runs = []
+    for lo, hi in spans if spans is not None else ((0, len(new)),):
+        for base in range(lo, hi, CHUNK_SIZE):
+            end = min(base + CHUNK_SIZE, hi)
+            # Cheap slice compare first, byte scan only inside dirty blocks
+            if new[base:end] == old[base:end]: continue
+            for i in range(base, end):
+                if new[i] != old[i]:
+                    if runs and i - runs[-1][1] <= gap: runs[-1][1] = i + 1
+                    else: runs.append([i, i + 1])
+    return runs
+
+def _page_box(rect):
+    """(x0, y0, x1, y1) clipped to the screen, rows rounded out to whole
+    pages; empty boxes become (0, 0, 0, 0)"""
+    x0, y0, x1, y1 = rect
+    x0, x1 = max(x0, 0), min(x1, SCREEN_W)
+    y0, y1 = max(y0 & ~7, 0), min((y1 + 7) & ~7, SCREEN_H)
+    if x0 >= x1 or y0 >= y1: return (0, 0, 0, 0)
+    return (x0, y0, x1, y1)
+
+def _dirty_spans(rects):
+    """Page aligned (x0, y0, x1, y1) boxes -> sorted, disjoint byte ranges"""
+    spans = sorted((page * SCREEN_W + x0, page * SCREEN_W + x1)
+                   for x0, y0, x1, y1 in rects for page in range(y0 >> 3, y1 >> 3))
+    merged = []
+    for a, b in spans:
+        if merged and a <= merged[-1][1]: merged[-1][1] = max(merged[-1][1], b)
+        else: merged.append([a, b])
+    return merged
+
+def _same_outside(new, old, rects):
+    """True if new and old only differ inside the boxes"""
+    pos = 0
+    for a, b in _dirty_spans(rects):
+        if new[pos:a] != old[pos:a]: return False
+        pos = b
+    return new[pos:] == old[pos:]
+
+# Byte translate tables for span writes: OR-ing (color) or AND-ing out
+# (background) a page mask over a whole run of columns in one C call.
+_SPAN_TABLES = {}
+
+def _span_table(mask, color):
+    key = (mask, bool(color))
+    table = _SPAN_TABLES.get(key)
+    if table is None:
+        if color: table = bytes(b | mask for b in range(256))
+        else: table = bytes(b & ~mask & 0xFF for b in range(256))
+        _SPAN_TABLES[key] = table
+    return table
+
+# Rounded-corner span tables, keyed by (radius, corner, cy % 8). Each entry
+# lists (dx, page offset, byte mask) relative to the corner centre, so a
+# corner is drawn with one byte op per touched column/page.
+CORNER_CACHE_SIZE = 64
+_CORNER_SPANS = OrderedDict()
+
+def _corner_spans(r, corner, align):
+    key = (r, corner, align)
+    spans = _CORNER_SPANS.get(key)
+    if spans is not None:
+        _CORNER_SPANS.move_to_end(key)
+        return spans
+    masks = {}
+    for d in range(r + 1):
+        e = math.isqrt(r * r - d * d)
+        dx = d if corner in (2, 3) else -d
+        rows = range(-e, 1) if corner in (1, 2) else range(0, e + 1)
+        for dy in rows:
+            y = align + dy
+            masks[(dx, y >> 3)] = masks.get((dx, y >> 3), 0) | (1 << (y & 7))
+    spans = tuple((dx, dp, mask) for (dx, dp), mask in masks.items())
+    _CORNER_SPANS[key] = spans
+    if len(_CORNER_SPANS) > CORNER_CACHE_SIZE: _CORNER_SPANS.popitem(last=False)
+    return spans
+
+def _triangle_spans(x0, y0, x1, y1, x2, y2):
+    """(ax, bx, y) pixel spans of a triangle sorted by y, rows 0..SCREEN_H-1"""
+    # Compute dx/dy
+    total_height = y2 - y0
+    if total_height == 0: return # Flat triangle
+
+    for i in range(total_height):
+        y = y0 + i
+        if y >= SCREEN_H: break
+        if y < 0: continue
+
+        second_half = i > y1 - y0 or y1 == y0
+        segment_height = y2 - y1 if second_half else y1 - y0
+
+        if segment_height == 0: continue # Degenerate segment
+
+        alpha = i / total_height
+        beta  = (i - (y1 - y0) if second_half else i) / segment_height
+
+        ax = int(x0 + (x2 - x0) * alpha)
+        bx = int(x1 + (x2 - x1) * beta) if second_half else int(x0 + (x1 - x0) * beta)
+
+        if ax > bx: ax, bx = bx, ax
+        yield ax, bx, y
+
+# Samples kept per pipeline stage for the rolling percentiles
+STATS_WINDOW = 256
+STAGES = ('update', 'raster', 'show', 'transport', 'frame')
+
+class FrameStats:
+    """Opt-in timings of the frame pipeline, see RoboEyes.enable_stats().
+
+    Stages (ms): update = tweening/state, raster = drawing or cache copy,
+    show = on_show callback, transport = write_io_map loop (own thread in
+    async mode), frame = whole frame. Percentiles cover the last `window`
+    frames.
+    """
+    def __init__(self, window=STATS_WINDOW, log_every=None, log_hook=None):
+        self.samples = {stage: deque(maxlen=window) for stage in STAGES}
+        self.bytes = deque(maxlen=window)
+        self.calls = deque(maxlen=window)
+        self.starts = deque(maxlen=window)
+        self.frames = 0
+        self.deadline_misses = 0
+        self.transport_errors = 0
+        self.log_every = log_every
+        self.log_hook = log_hook
+        self._last_log = time.monotonic()
+
+    def add(self, stage, ms):
+        self.samples[stage].append(ms)
+
+    def add_transport(self, ms, calls, nbytes, error=False):
+        self.samples['transport'].append(ms)
+        self.calls.append(calls)
+        self.bytes.append(nbytes)
+        if error: self.transport_errors += 1
+
+    def end_frame(self, ms, interval, late=False, start_ms=None):
+        now = time.monotonic()
+        self.frames += 1
+        self.samples['frame'].append(ms)
+        # Frame start on the eyes' clock (simulated in headless mode)
+        self.starts.append(start_ms if start_ms is not None else now * 1000)
+        # Missed the deadline: started a whole slot late or took too long
+        if late or ms > interval: self.deadline_misses += 1
+        if self.log_every and now - self._last_log >= self.log_every:
+            self._last_log = now
+            report = self.stats()
+            if self.log_hook: self.log_hook(report)
+            else: log.info("frames=%d fps=%.1f misses=%d frame p50/p99=%.2f/%.2f ms transport p50=%.2f ms errors=%d",
+                           report['frames'], report['fps'], report['deadline_misses'], report['stages']['frame']['p50'],
+                           report['stages']['frame']['p99'], report['stages']['transport']['p50'], report['transport_errors'])
+
+    @staticmethod
+    def _summary(values):
+        if not values: return {'n': 0, 'mean': 0.0, 'p50': 0.0, 'p90': 0.0, 'p99': 0.0, 'max': 0.0}
+        v = sorted(values)
+        pick = lambda q: v[min(len(v) - 1, int(q * len(v)))]
+        return {'n': len(v), 'mean': sum(v) / len(v), 'p50': pick(0.5), 'p90': pick(0.9), 'p99': pick(0.99), 'max': v[-1]}
+
+    def stats(self):
+        span = self.starts[-1] - self.starts[0] if len(self.starts) > 1 else 0
+        return {
+            'frames': self.frames,
+            'fps': (len(self.starts) - 1) * 1000 / span if span else 0.0,
+            'deadline_misses': self.deadline_misses,
+            'transport_errors': self.transport_errors,
+            'bytes_per_frame': sum(self.bytes) / len(self.bytes) if self.bytes else 0.0,
+            'calls_per_frame': sum(self.calls) / len(self.calls) if self.calls else 0.0,
+            'stages': {stage: self._summary(self.samples[stage]) for stage in STAGES},
+        }
+
+# Adaptive frame rate (RoboEyes.enable_adaptive_framerate): share of the
+# frame interval the link (or the render loop) may be busy
+ADAPT_HEADROOM = 0.8
+# Smoothing of the per-frame costs: follow slow frames fast, fast ones slowly
+ADAPT_RISE = 0.5
+ADAPT_FALL = 0.05
+# Decay of the link model sums per transport sample
+LINK_DECAY = 0.98
+
+class RateController:
+    """Picks the frame interval from measured link and render costs.
+
+    Every write burst of NxtDisplay._send feeds a least-squares fit of
+    ms = per_call_ms * calls + per_byte_ms * bytes and a smoothed link
+    time per frame; every drawn frame feeds its own duration. The frame
+    interval is set so neither the link nor the render loop is busier than
+    `headroom`, within [1000/max_fps, 1000/min_fps]. Frames dropped by the
+    async transport push the interval up further. With tune_merge_gap the
+    display's merge_gap becomes per_call_ms / per_byte_ms: an unchanged
+    gap is worth sending when it is cheaper than one more call.
+    """
+    def __init__(self, min_fps=5, max_fps=30, headroom=ADAPT_HEADROOM, tune_merge_gap=True):
+        self.min_interval = 1000 // max_fps
+        self.max_interval = 1000 // min_fps
+        self.headroom = headroom
+        self.tune_merge_gap = tune_merge_gap
+        self.link_ms = 0.0  # smoothed write time per frame
+        self.frame_ms = 0.0 # smoothed update() time per drawn frame
+        self.per_call_ms = 0.0
+        self.per_byte_ms = 0.0
+        self.fps = 0.0      # effective frame rate chosen last
+        self._sums = [0.0] * 5 # cc, cb, bb, ct, bt
+        self._backoff = 1.0
+        self._dropped = 0
+
+    @staticmethod
+    def _smooth(value, sample):
+        return value + (ADAPT_RISE if sample > value else ADAPT_FALL) * (sample - value)
+
+    def add_transport(self, ms, calls, nbytes):
+        # Called from the transport thread in async mode
+        self.link_ms = self._smooth(self.link_ms, ms)
+        if not calls: return
+        s = self._sums
+        for i, v in enumerate((calls * calls, calls * nbytes, nbytes * nbytes, calls * ms, nbytes * ms)):
+            s[i] = s[i] * LINK_DECAY + v
+        cc, cb, bb, ct, bt = s
+        det = cc * bb - cb * cb
+        if det > 1e-9 * cc * bb:
+            self.per_call_ms = max(0.0, (ct * bb - bt * cb) / det)
+            self.per_byte_ms = max(0.0, (bt * cc - ct * cb) / det)
+        else:
+            # Every write had the same size so far, charge it all to the call
+            self.per_call_ms = ct / cc
+            self.per_byte_ms = 0.0
+
+    def end_frame(self, eyes, ms):
+        self.frame_ms = self._smooth(self.frame_ms, ms)
+        transport = getattr(eyes.fb, 'transport', None)
+        dropped = transport.frames_dropped if transport is not None else 0
+        if dropped > self._dropped: self._backoff = min(self._backoff * 1.25, 4.0)
+        else: self._backoff = max(1.0, self._backoff * 0.98)
+        self._dropped = dropped
+        # In sync mode frame_ms already includes the link time
+        budget = max(self.frame_ms, self.link_ms) / self.headroom * self._backoff
+        interval = int(min(max(budget, self.min_interval), self.max_interval))
+        eyes.frameInterval = interval
+        self.fps = 1000 / interval
+        if self.tune_merge_gap and hasattr(eyes.fb, 'merge_gap') and self.per_call_ms:
+            chunk = getattr(eyes.fb, 'chunk_size', CHUNK_SIZE)
+            gap = self.per_call_ms / self.per_byte_ms if self.per_byte_ms else chunk
+            eyes.fb.merge_gap = int(min(gap, chunk))
+
+class TransportWorker:
+    """Sends display frames from a background thread.
+
+    The mailbox holds a single frame: posting while the previous frame is
+    still waiting replaces it (latest frame wins), so rendering never
+    blocks on the USB/Bluetooth link. A frame whose send() raises is
+    logged and handed to on_error(exception); the thread keeps running.
+    """
+    def __init__(self, send, name='nxt-display', on_error=None):
+        self._send = send
+        self._on_error = on_error
+        self._cond = threading.Condition()
+        self._pending = None # (frame, force_full, dirty)
+        self._busy = False
+        self._closed = False
+        self.frames_posted = 0
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def post(self, frame, force_full=False, dirty=None):
+        with self._cond:
+            if self._closed: return
+            if self._pending is not None:
+                # The replaced frame was never sent, its dirty regions still count
+                self.frames_dropped += 1
+                _, pending_full, pending_dirty = self._pending
+                force_full = force_full or pending_full
+                dirty = None if dirty is None or pending_dirty is None else pending_dirty + dirty
+            self._pending = (frame, force_full, dirty)
+            self.frames_posted += 1
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._pending is None: return # closed and drained
+                frame, force_full, dirty = self._pending
+                self._pending = None
+                self._busy = True
+            try:
+                self._send(frame, force_full, dirty)
+            except Exception as e:
+                # A dead thread would leave flush() waiting forever
+                log.exception("display frame send failed")
+                if self._on_error: self._on_error(e)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self.frames_sent += 1
+                    self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Wait until the last posted frame is on the brick. False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending is None and not self._busy, timeout)
+
+    def close(self, timeout=None):
+        """Send the pending frame (if any) and stop the thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+def _noreply_writer(brick):
+    """write(mod_id, offset, data) that does not wait for a reply, None
+    if the brick can't do it"""
+    write = getattr(brick, 'write_io_map_noreply', None)
+    if write is not None: return write
+    cmd = getattr(brick, '_cmd_noreply', None)
+    if cmd is None: return None
+    try:
+        from nxt.telegram import Telegram, Opcode
+    except ImportError:
+        return None
+    def write(mod_id, offset, data):
+        tgram = Telegram(Opcode.SYSTEM_IOMAPWRITE, reply_req=False)
+        tgram.add_u32(mod_id)
+        tgram.add_u16(offset)
+        tgram.add_u16(len(data))
+        tgram.add_bytes(data)
+        cmd(tgram)
+    return write
+
+def _max_payload(brick):
+    """Largest IOMap write worth probing: nxt-python sends file data as
+    3 header bytes + sock.bsize, so telegrams that long are known to pass"""
+    limit = getattr(brick, 'max_payload', None)
+    if limit is not None: return limit
+    bsize = getattr(getattr(brick, '_sock', None), 'bsize', None)
+    if bsize is None: return CHUNK_SIZE
+    return max(bsize + 3 - IOMAP_WRITE_HEADER, CHUNK_SIZE)
 
 class NxtDisplay:
-    def __init__(self, brick):
+    def __init__(self, brick, chunk_size=CHUNK_SIZE, merge_gap=MERGE_GAP, async_transport=False, transport_name='nxt-display'):
         self.brick = brick
         # Use direct memory map if available (faster)
         self.use_iomap = hasattr(brick, 'write_io_map')
         self.buf = bytearray(BUFFER_SIZE)
+        self.chunk_size = chunk_size
+        self.merge_gap = merge_gap
+        # Shadow copy of the last frame the brick acknowledged (None = unknown)
+        self._sent = None
+        self.bytes_sent = 0
+        self.bytes_saved = 0
+        self.transport_errors = 0
+        self.frame_stats = None # FrameStats, set by RoboEyes.enable_stats()
+        self.rate_controller = None # RateController, see RoboEyes.enable_adaptive_framerate()
+        self.recorder = None # nxt_record.Recorder, gets every frame _send() writes
+        # Last frame handed to update(), see nxt_connect.ReconnectingBrick
+        self.last_frame = None
+        # No-reply writer while pipelining (see enable_pipelining)
+        self._noreply = None
+        self.pipeline_window = PIPELINE_WINDOW
+        self.pipeline_failures = 0
+        self.pipeline_fallbacks = 0
+        # Clip box (x0, y0, x1, y1), rows in whole pages, None = whole screen
+        self.clip = None
+        self._bounds = (0, 0, SCREEN_W, SCREEN_H)
+        # Boxes drawn since the last update(), None = anything may have changed
+        self._dirty = None
+        # Optional background sender (thread `transport_name`), see TransportWorker
+        self.transport = None
+        if async_transport and self.use_iomap:
+            self.transport = TransportWorker(self._send, transport_name, self._send_failed)
 
     def clear(self):
-        """Clear the buffer (fill with 0)"""
-        for i in range(BUFFER_SIZE):
-            self.buf[i] = 0
+        """Clear the buffer (fill with 0), only the clip box if one is set"""
+        self.fill(0)
 
     def fill(self, color):
-        val = 0xFF if color else 0x00
-        for i in range(BUFFER_SIZE):
-            self.buf[i] = val
+        val = b'\xff' if color else b'\x00'
+        if self.clip is None:
+            self.buf[:] = val * BUFFER_SIZE
+            self._dirty = None
+            return
+        x0, y0, x1, y1 = self.clip
+        for page in range(y0 >> 3, y1 >> 3):
+            self.buf[page * SCREEN_W + x0:page * SCREEN_W + x1] = val * (x1 - x0)
+
+    def set_clip(self, rect=None):
+        """Restrict drawing, clear() and fill() to the box (x0, y0, x1, y1),
+        end exclusive, rows rounded out to whole pages. set_clip() removes it.
+        Boxes drawn under a clip are all update() compares and sends, if
+        the buffer still held the last updated frame when the first clip
+        was set (see _mark_dirty)."""
+        if rect is None:
+            self.clip = None
+            self._bounds = (0, 0, SCREEN_W, SCREEN_H)
+            return
+        self.clip = self._bounds = _page_box(rect)
+        if self.clip[0] < self.clip[2]: self._mark_dirty([self.clip])
+
+    def _mark_dirty(self, boxes):
+        # Only `boxes` change until the next update(). Tracking starts only
+        # while the buffer holds the last frame handed to update(), so
+        # anything written to buf directly before is still compared and sent.
+        if self._dirty is None:
+            if self.last_frame is None or self.get_frame() != self.last_frame: return
+            self._dirty = []
+        self._dirty.extend(boxes)
+
+    def _frame_dirty(self, dirty):
+        if dirty is None: self._dirty = None
+        else: self._mark_dirty([box for box in map(_page_box, dirty) if box[0] < box[2]])
 
     def set_pixel(self, x, y, color):
-        if not (0 <= x < SCREEN_W and 0 <= y < SCREEN_H):
+        if self.clip is None: self._dirty = None
+        x0, y0, x1, y1 = self._bounds
+        if not (x0 <= x < x1 and y0 <= y < y1):
             return
         page = y // 8
         idx = page * SCREEN_W + x
@@ -39,40 +459,216 @@ class NxtDisplay:
         else:
             self.buf[idx] &= (~mask & 0xFF)
 
-    def update(self):
+    def get_frame(self):
+        """Snapshot of the buffer in NXT page layout"""
+        return bytes(self.buf)
+
+    def set_frame(self, frame, dirty=None):
+        """Replace the buffer. dirty: boxes outside which frame equals the
+        buffer, limiting what update() compares; None = anywhere"""
+        self._frame_dirty(dirty)
+        self.buf[:] = frame
+
+    def invalidate(self):
+        """Forget what the brick shows, the next update() sends the full frame"""
+        self._sent = None
+
+    def flush(self, timeout=None):
+        """Block until the last update() reached the brick"""
+        if self.transport: return self.transport.flush(timeout)
+        return True
+
+    def close(self, timeout=None):
+        """Stop the background sender after it delivered the last frame"""
+        if self.transport:
+            self.transport.close(timeout)
+            self.transport = None
+
+    def update(self, force_full=False):
         if self.use_iomap:
-            try:
-                # 20 chunks of 40 bytes
-                for i in range(20):
-                    start = i * 40
-                    chunk = self.buf[start:start + 40]
-                    self.brick.write_io_map(MOD_DISPLAY, DISPLAY_OFFSET + start, bytes(chunk))
-            except Exception as e:
-                pass # Suppress errors for robustness during animation
+            dirty, self._dirty = self._dirty, None
+            frame = bytes(self.buf)
+            # buf written directly after tracking started: compare everything
+            if dirty is not None and not _same_outside(frame, self.last_frame, dirty): dirty = None
+            self.last_frame = frame
+            if self.transport:
+                self.transport.post(frame, force_full, dirty)
+            else:
+                self._send(frame, force_full, dirty)
         else:
             # Fallback to high-level display (very slow, not recommended for animation)
             pass
 
+    def enable_pipelining(self, window=PIPELINE_WINDOW):
+        """Probe the largest IOMap write the link accepts and send frames as
+        no-reply writes with a reply barrier every `window` writes and at the
+        end of the frame, where errors are checked. Returns True when
+        no-reply writes work, False when only the chunk size changed.
+        After PIPELINE_MAX_FAILURES failed frames in a row it falls back to
+        the safe path (one reply per write)."""
+        if not self.use_iomap: raise RuntimeError("pipelining needs a brick with write_io_map")
+        if window < 1: raise ValueError("window must be >= 1")
+        self.flush()
+        brick = self.brick
+        limit = _max_payload(brick)
+        screen = b''.join(brick.read_io_map(MOD_DISPLAY, DISPLAY_OFFSET + pos, CHUNK_SIZE)[1]
+                          for pos in range(0, limit, CHUNK_SIZE))[:limit]
+        # Write the screen back as it is, largest size first
+        self.chunk_size = CHUNK_SIZE
+        for size in sorted({limit, (limit + CHUNK_SIZE) // 2, CHUNK_SIZE}, reverse=True):
+            try:
+                if brick.write_io_map(MOD_DISPLAY, DISPLAY_OFFSET, screen[:size])[1] == size:
+                    self.chunk_size = size
+                    break
+            except Exception as e:
+                log.debug("%d byte IOMap write rejected: %r", size, e)
+        # A no-reply write must really land: flip one byte, read it back, restore
+        write = _noreply_writer(brick)
+        if write is not None:
+            try:
+                write(MOD_DISPLAY, DISPLAY_OFFSET, bytes((screen[0] ^ 0xFF,)))
+                ok = brick.read_io_map(MOD_DISPLAY, DISPLAY_OFFSET, 1)[1][0] == screen[0] ^ 0xFF
+                brick.write_io_map(MOD_DISPLAY, DISPLAY_OFFSET, screen[:1])
+            except Exception as e:
+                log.debug("no-reply IOMap write failed: %r", e)
+                ok = False
+            if not ok: write = None
+        self._noreply = write
+        self.pipeline_window = window
+        self.pipeline_failures = 0
+        return write is not None
+
+    def disable_pipelining(self):
+        """Back to CHUNK_SIZE writes that each wait for their reply"""
+        self.flush()
+        self._noreply = None
+        self.chunk_size = CHUNK_SIZE
+
+    def _write_chunks(self, chunks):
+        """Write the (pos, chunk) pairs. Returns (bytes, calls, error): what the
+        brick confirmed, and the exception that stopped the frame or None.
+        No-reply writes only count once a later reply barrier came back."""
+        write = self.brick.write_io_map
+        noreply = self._noreply
+        sent = calls = 0
+        if noreply is None:
+            try:
+                for pos, chunk in chunks:
+                    write(MOD_DISPLAY, DISPLAY_OFFSET + pos, chunk)
+                    sent += len(chunk)
+                    calls += 1
+            except Exception as e:
+                return sent, calls, e
+            return sent, calls, None
+        pending = 0
+        try:
+            last = len(chunks) - 1
+            for i, (pos, chunk) in enumerate(chunks):
+                pending += len(chunk)
+                if i == last or i % self.pipeline_window == self.pipeline_window - 1:
+                    # Reply barrier: the brick has handled everything before it
+                    size = write(MOD_DISPLAY, DISPLAY_OFFSET + pos, chunk)[1]
+                    if size != len(chunk): raise IOError(f"IOMap write of {len(chunk)} bytes wrote {size}")
+                    sent += pending
+                    calls = i + 1
+                    pending = 0
+                else:
+                    noreply(MOD_DISPLAY, DISPLAY_OFFSET + pos, chunk)
+        except Exception as e:
+            self.pipeline_failures += 1
+            if self.pipeline_failures >= PIPELINE_MAX_FAILURES:
+                log.warning("pipelined display writes keep failing, back to one reply per write")
+                self._noreply = None
+                self.chunk_size = CHUNK_SIZE
+                self.pipeline_fallbacks += 1
+            return sent, calls, e
+        self.pipeline_failures = 0
+        return sent, calls, None
+
+    def _send_failed(self, error):
+        # Keep animating, but count it: screen content is unknown now,
+        # resend everything next time
+        self._sent = None
+        self.transport_errors += 1
+        log.debug("display update failed: %r", error)
+
+    def _send(self, frame, force_full=False, dirty=None):
+        """Write frame to the brick, only the runs that differ from the shadow.
+        dirty: boxes that may have changed since the shadow, None = all"""
+        st = self.frame_stats
+        rc = self.rate_controller
+        if st is not None or rc is not None: t0 = time.perf_counter()
+        if force_full or self._sent is None:
+            runs = [(0, BUFFER_SIZE)]
+        else:
+            runs = _changed_runs(frame, self._sent, self.merge_gap, None if dirty is None else _dirty_spans(dirty))
+        size = self.chunk_size
+        chunks = [(pos, frame[pos:min(pos + size, end)]) for start, end in runs for pos in range(start, end, size)]
+        sent, calls, error = self._write_chunks(chunks)
+        if error is not None:
+            self._send_failed(error)
+        else:
+            self._sent = frame
+            self.bytes_saved += BUFFER_SIZE - sent
+        self.bytes_sent += sent
+        if st is not None or rc is not None:
+            ms = (time.perf_counter() - t0) * 1000
+            if st is not None: st.add_transport(ms, calls, sent, error is not None)
+            # A failed burst says nothing about the link speed
+            if rc is not None and error is None: rc.add_transport(ms, calls, sent)
+        if self.recorder is not None: self.recorder.add(frame, sent, calls, error is not None)
+
+    # --- Span writers (page layout: 8 vertical pixels per byte) ---
+
+    def _fill_pages(self, x0, x1, y0, y1, color):
+        """Fill the clipped box [x0, x1) x [y0, y1), one translate per page"""
+        buf = self.buf
+        for page in range(y0 >> 3, ((y1 - 1) >> 3) + 1):
+            top = page << 3
+            lo = y0 - top if y0 > top else 0
+            hi = y1 - top if y1 - top < 8 else 8
+            mask = (0xFF << lo) & (0xFF >> (8 - hi))
+            a = page * SCREEN_W + x0
+            b = page * SCREEN_W + x1
+            buf[a:b] = bytes(buf[a:b]).translate(_span_table(mask, color))
+
+    def _hspan(self, x0, x1, y, color):
+        """Set pixels x0..x1 (inclusive) of row y"""
+        cx0, cy0, cx1, cy1 = self._bounds
+        if not (cy0 <= y < cy1): return
+        if x0 < cx0: x0 = cx0
+        if x1 >= cx1: x1 = cx1 - 1
+        if x0 > x1: return
+        start = (y >> 3) * SCREEN_W
+        a = start + x0
+        b = start + x1 + 1
+        self.buf[a:b] = bytes(self.buf[a:b]).translate(_span_table(1 << (y & 7), color))
+
     # --- Drawing Primitives (FBUtil equivalents) ---
 
     def fill_rect(self, x, y, w, h, color):
+        if self.clip is None: self._dirty = None
         # Clipping
-        if x < 0:
-            w += x
-            x = 0
-        if y < 0:
-            h += y
-            y = 0
-        if x + w > SCREEN_W: w = SCREEN_W - x
-        if y + h > SCREEN_H: h = SCREEN_H - y
+        cx0, cy0, cx1, cy1 = self._bounds
+        if x < cx0:
+            w -= cx0 - x
+            x = cx0
+        if y < cy0:
+            h -= cy0 - y
+            y = cy0
+        if x + w > cx1: w = cx1 - x
+        if y + h > cy1: h = cy1 - y
         
         if w <= 0 or h <= 0: return
 
-        for py in range(y, y + h):
-            for px in range(x, x + w):
-                self.set_pixel(px, py, color)
+        self._fill_pages(x, x + w, y, y + h, color)
 
     def fill_rrect(self, x, y, w, h, r, color):
+        if self.clip is not None:
+            # Nothing of it inside the clip box: skip the corner lookups
+            x0, y0, x1, y1 = _rrect_box(x, y, w, h, r)
+            cx0, cy0, cx1, cy1 = self.clip
+            if x1 <= cx0 or x0 >= cx1 or y1 <= cy0 or y0 >= cy1: return
         # Naive implementation: fill rects and circles
         # Center rect
         self.fill_rect(x, y + r, w, h - 2 * r, color)
@@ -87,17 +683,21 @@ class NxtDisplay:
 
     def _fill_circle_helper(self, cx, cy, r, corner, color):
         # corner: 1=TL, 2=TR, 3=BR, 4=BL
-        # Uses midpoint circle algorithm logic but for filled quadrants
-        
-        # A simple way for small r is just checking distance for pixels in the corner box
-        for dy in range(-r, r + 1):
-            for dx in range(-r, r + 1):
-                if dx*dx + dy*dy <= r*r:
-                    # Check quadrant
-                    if corner == 1 and dx <= 0 and dy <= 0: self.set_pixel(cx+dx, cy+dy, color)
-                    if corner == 2 and dx >= 0 and dy <= 0: self.set_pixel(cx+dx, cy+dy, color)
-                    if corner == 3 and dx >= 0 and dy >= 0: self.set_pixel(cx+dx, cy+dy, color)
-                    if corner == 4 and dx <= 0 and dy >= 0: self.set_pixel(cx+dx, cy+dy, color)
+        # Filled quadrant of the disc dx*dx + dy*dy <= r*r, looked up from
+        # the cached span table
+        if r < 0: return
+        if self.clip is None: self._dirty = None
+        buf = self.buf
+        base = cy >> 3
+        cx0, cy0, cx1, cy1 = self._bounds
+        p0, p1 = cy0 >> 3, cy1 >> 3
+        for dx, dp, mask in _corner_spans(r, corner, cy & 7):
+            x = cx + dx
+            page = base + dp
+            if cx0 <= x < cx1 and p0 <= page < p1:
+                idx = page * SCREEN_W + x
+                if color: buf[idx] |= mask
+                else: buf[idx] &= ~mask & 0xFF
 
     def fill_triangle(self, x0, y0, x1, y1, x2, y2, color):
         # Sort coordinates by Y
@@ -105,30 +705,10 @@ class NxtDisplay:
         if y0 > y2: x0, y0, x2, y2 = x2, y2, x0, y0
         if y1 > y2: x1, y1, x2, y2 = x2, y2, x1, y1
 
-        # Compute dx/dy
-        total_height = y2 - y0
-        if total_height == 0: return # Flat triangle
-
-        for i in range(total_height):
-            y = y0 + i
-            if y >= SCREEN_H: break
-            if y < 0: continue
-            
-            second_half = i > y1 - y0 or y1 == y0
-            segment_height = y2 - y1 if second_half else y1 - y0
-            
-            if segment_height == 0: continue # Degenerate segment
-
-            alpha = i / total_height
-            beta  = (i - (y1 - y0) if second_half else i) / segment_height
-            
-            ax = int(x0 + (x2 - x0) * alpha)
-            bx = int(x1 + (x2 - x1) * beta) if second_half else int(x0 + (x1 - x0) * beta)
-
-            if ax > bx: ax, bx = bx, ax
-            
-            for j in range(ax, bx + 1):
-                self.set_pixel(j, y, color)
+        if y2 == y0: return # Flat triangle
+        if self.clip is None: self._dirty = None
+        for ax, bx, y in _triangle_spans(x0, y0, x1, y1, x2, y2):
+            self._hspan(ax, bx, y, color)
 
 
 # --- Ported RoboEyes Library ---
@@ -146,6 +726,26 @@ FROZEN  = 4
 SCARY   = 5
 CURIOUS = 6
 
+# Rendered frames kept per RoboEyes (or per shared FrameCache)
+FRAME_CACHE_SIZE = 32
+
+# Longest sleep of the run loops, so on_tick hooks and API calls from
+# other threads are picked up even when no timer is due (seconds)
+RUN_MAX_SLEEP = 0.1
+
+# Tweening modes (RoboEyes.set_tweening): 'halving' moves every value half
+# way to its target per frame (speed depends on the frame rate), 'time'
+# eases it there in a fixed number of milliseconds
+TWEEN_HALVING = 'halving'
+TWEEN_TIME = 'time'
+# Time tweened channels and their duration group
+TWEEN_CHANNELS = (('Lw', 'size'), ('Lh', 'size'), ('Rw', 'size'), ('Rh', 'size'),
+                  ('Lr', 'radius'), ('Rr', 'radius'),
+                  ('space', 'move'), ('x', 'move'), ('y', 'move'),
+                  ('tired', 'eyelids'), ('angry', 'eyelids'), ('happy', 'eyelids'))
+# Durations (ms), close to how long halving takes at 20 fps
+TWEEN_DURATIONS = {'size': 150, 'radius': 150, 'move': 250, 'eyelids': 250}
+
 # Directions
 N  = 1 
 NE = 2 
@@ -156,6 +756,24 @@ SW = 6
 W  = 7 
 NW = 8 
 
+def linear(t): return t
+def ease_out_quad(t): return t * (2 - t)
+def ease_in_out_quad(t): return 2 * t * t if t < 0.5 else 1 - 2 * (1 - t) * (1 - t)
+
+EASINGS = {'linear': linear, 'ease_out': ease_out_quad, 'ease_in_out': ease_in_out_quad}
+
+_TWEEN_INDEX = {name: i for i, (name, _) in enumerate(TWEEN_CHANNELS)}
+
+def _tween_value(rec, now, duration, ease):
+    # rec = (start, target, t0), t0 is None once the target is reached
+    start, end, t0 = rec
+    if t0 is None or now - t0 >= duration: return end
+    return start + (end - start) * ease((now - t0) / duration)
+
+def ticks_ms():
+    """Default RoboEyes clock, monotonic time in milliseconds"""
+    return int(time.monotonic() * 1000)
+
 class StepData:
     def __init__( self, owner_seq, ms_timing, _lambda ):
         self.done = False
@@ -163,64 +781,256 @@ class StepData:
         self._lambda = _lambda
         self.owner_seq = owner_seq 
 
+    def run( self ):
+        self._lambda( self.owner_seq.owner ) 
+        self.done = True
+
     def update( self, ticks_ms ):
         if self.done: return 
         if (ticks_ms - self.owner_seq._start) < self.ms_timing: return
-        self._lambda( self.owner_seq.owner ) 
-        self.done = True
+        self.run()
 
 class Sequence( list ):
-    def __init__( self, owner, name ):
+    def __init__( self, owner, name, parent=None ):
         super().__init__()
         self.owner = owner
         self.name = name
+        self.parent = parent # Sequences scheduler, None = poll with update()
         self._start = None
+        self._gen = 0        # bumped on start/reset, invalidates queued steps
+        self._pending = 0
+        self._order = len(parent) if parent is not None else 0
 
     def step( self, ms_timing, _lambda ):
         _r = StepData( self, ms_timing, _lambda )
         self.append( _r )
+        if self._start is not None: self._schedule( _r, len(self) - 1 )
+
+    def _schedule( self, _step, index ):
+        self._pending += 1
+        if self.parent is not None:
+            self.parent._pending += 1
+            self.parent._push( self._start + _step.ms_timing, self, index, _step )
+
+    def _step_done( self ):
+        self._pending -= 1
+        if self.parent is not None: self.parent._pending -= 1
 
     def start( self ):
-        self._start = int(time.time() * 1000)
+        self._cancel()
+        self._start = self.owner.clock()
+        for index, _step in enumerate( self ):
+            if not _step.done: self._schedule( _step, index )
+
+    def _cancel( self ):
+        self._gen += 1
+        if self.parent is not None: self.parent._pending -= self._pending
+        self._pending = 0
 
     def reset( self ):
+        self._cancel()
         self._start = None
         for _step in self:
             _step.done = False
 
     @property
     def done( self ):
-        if self._start is None: return True
-        return all([ _step.done for _step in self ])
+        return self._start is None or self._pending == 0
 
     def update( self, ticks_ms ):
         if self._start is None: return
         for _step in self:
-            if not _step.done: _step.update(ticks_ms)
+            if not _step.done:
+                gen = self._gen
+                _step.update(ticks_ms)
+                if _step.done and self._gen == gen: self._step_done()
 
 class Sequences( list ):
+    """Sequences with a shared timer heap: update() only touches due steps"""
     def __init__( self, owner ):
         super().__init__()
         self.owner = owner 
+        self._heap = []    # (due_ms, seq order, step index, generation, seq, step)
+        self._pending = 0  # queued steps of running sequences
 
     def add( self, name  ):
-        _r = Sequence( self.owner, name ) 
+        _r = Sequence( self.owner, name, self ) 
         self.append( _r )
         return _r
 
+    def _push( self, due, seq, index, _step ):
+        heapq.heappush( self._heap, (due, seq._order, index, seq._gen, seq, _step) )
+
     @property
     def done( self ):
-        return all( [ _seq.done for _seq in self ] )
+        return self._pending == 0
+
+    def next_deadline( self ):
+        """Clock time (ms) of the earliest queued step, None when idle"""
+        heap = self._heap
+        while heap and (heap[0][3] != heap[0][4]._gen or heap[0][5].done):
+            heapq.heappop( heap ) # stale: sequence restarted/reset
+        return heap[0][0] if heap else None
 
     def update( self ):
-        _ms_ticks = int(time.time() * 1000)
-        for _seq in self: _seq.update( _ms_ticks )
+        heap = self._heap
+        if not heap: return
+        _ms_ticks = self.owner.clock()
+        while heap and heap[0][0] <= _ms_ticks:
+            _, _, _, gen, seq, _step = heapq.heappop( heap )
+            if gen != seq._gen or _step.done: continue
+            _step.run()
+            if seq._gen == gen: seq._step_done() # unless the step restarted it
+
+
+class FrameCache:
+    """Small LRU of rendered frames keyed by RoboEyes.frame_key()"""
+    def __init__(self, size=FRAME_CACHE_SIZE):
+        self.size = size
+        self.frames = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        frame = self.frames.get(key)
+        if frame is None:
+            self.misses += 1
+            return None
+        self.frames.move_to_end(key)
+        self.hits += 1
+        return frame
+
+    def put(self, key, frame):
+        self.frames[key] = frame
+        if len(self.frames) > self.size: self.frames.popitem(last=False)
 
+    def clear(self):
+        self.frames.clear()
+
+
+# Boxes are (x0, y0, x1, y1), end exclusive, None = empty
+
+# Largest area (pixels) RoboEyes repaints through a clip box, bigger
+# changes repaint the whole frame
+DIRTY_MAX_AREA = SCREEN_W * SCREEN_H // 3
+
+def _rrect_box(x, y, w, h, r):
+    """Box touched by NxtDisplay.fill_rrect (corners can stick out for big r)"""
+    return (min(x, x + w - r - 1), min(y, y + h - r - 1), max(x + w, x + r + 1), max(y + h, y + r + 1))
+
+def _union_box(a, b):
+    if a is None: return b
+    if b is None: return a
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+def _box_area(box):
+    x0, y0, x1, y1 = box
+    return (x1 - x0) * (y1 - y0)
+
+def _intersect_box(a, b):
+    if a is None or b is None: return None
+    box = (max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3]))
+    return box if box[0] < box[2] and box[1] < box[3] else None
+
+@lru_cache(maxsize=256)
+def _eye_boxes(shape):
+    """(eye box, eyelid box) of one eye, shape as in RoboEyes._eye_shapes()"""
+    x, y, w, h, r, tired, angry, happy, height_default = shape
+    eye = _rrect_box(x, y, w, h, r)
+    # Tired/angry triangles hang from y-1, happy cuts from below
+    lids = (min(x, x + w), y - 1, max(x, x + w) + 1, y + max(tired, angry, 0))
+    lids = _union_box(lids, _rrect_box(x - 1, y + h - happy + 1, w + 2, height_default, r))
+    return eye, lids
+
+# --- Column compositor ---
+# The screen as one int in column-major order: column c owns the bits
+# [c * COL_STRIDE, (c + 1) * COL_STRIDE) and screen row y is bit COL_BIAS + y
+# of its column, so shapes above/below the screen never spill into the next
+# column. Eyes are ORed in, eyelids cut out with & ~, and one to_bytes()
+# yields the page bytes of every column.
+COL_STRIDE = 256
+COL_BIAS = 96
+
+def _col_run(c0, c1):
+    """Bit 0 of every column in [c0, c1)"""
+    if c1 <= c0: return 0
+    return ((1 << (COL_STRIDE * (c1 - c0))) - 1) // ((1 << COL_STRIDE) - 1) << (c0 * COL_STRIDE)
+
+_SCREEN_BITS = _col_run(0, SCREEN_W) * (((1 << SCREEN_H) - 1) << COL_BIAS)
+
+def _col_rect(x, y, w, h):
+    # fill_rect(x, y, w, h) before clipping
+    if w <= 0 or h <= 0: return 0
+    return _col_run(x, x + w) * (((1 << h) - 1) << (y + COL_BIAS))
+
+@lru_cache(maxsize=128)
+def _rrect_columns(w, h, r):
+    """fill_rrect(pad, 0, w, h, r) as column bits, padded so the corners of
+    squashed shapes (w or h below 2 * r) stay at columns >= 0. Returns
+    (bits, pad, first row, end row)."""
+    pad = r + 1 + max(0, -w)
+    bits = _col_rect(pad, r, w, h - 2 * r) | _col_rect(pad + r, 0, w - 2 * r, r) | _col_rect(pad + r, h - r, w - 2 * r, r)
+    for d in range(r + 1):
+        e = math.isqrt(r * r - d * d)
+        top = ((1 << (e + 1)) - 1) << (r - e + COL_BIAS)     # rows r-e .. r
+        bottom = ((1 << (e + 1)) - 1) << (h - r - 1 + COL_BIAS) # rows h-r-1 .. h-r-1+e
+        left = 1 << ((pad + r - d) * COL_STRIDE)
+        right = 1 << ((pad + w - r - 1 + d) * COL_STRIDE)
+        bits |= (left | right) * top | (left | right) * bottom
+    return bits, pad, min(0, h - r - 1), max(h, r + 1)
+
+@lru_cache(maxsize=256)
+def _triangle_columns(x0, y0, x1, y1, x2, y2):
+    """fill_triangle() with screen clipping as column bits"""
+    if y0 > y1: x0, y0, x1, y1 = x1, y1, x0, y0
+    if y0 > y2: x0, y0, x2, y2 = x2, y2, x0, y0
+    if y1 > y2: x1, y1, x2, y2 = x2, y2, x1, y1
+    bits = 0
+    for ax, bx, y in _triangle_spans(x0, y0, x1, y1, x2, y2):
+        bits |= _col_run(max(ax, 0), min(bx, SCREEN_W - 1) + 1) << (y + COL_BIAS)
+    return bits
+
+def _place_rrect(x, y, w, h, r):
+    """Column bits of fill_rrect(x, y, w, h, r), None if it would not fit"""
+    if r < 0: return None
+    bits, pad, first, end = _rrect_columns(w, h, r)
+    if y + first < -COL_BIAS or y + end > COL_STRIDE - COL_BIAS: return None
+    shift = (x - pad) * COL_STRIDE + y
+    return bits << shift if shift >= 0 else bits >> -shift
+
+def _column_frame(bits):
+    """Column bits -> 800 bytes in NXT page layout"""
+    data = (bits & _SCREEN_BITS).to_bytes(SCREEN_W * COL_STRIDE // 8, 'little')
+    step = COL_STRIDE // 8
+    return b''.join(data[COL_BIAS // 8 + page::step] for page in range(SCREEN_H // 8))
+
+# RoboEyes attributes that drive the next frames, see anim_state(). Timer
+# deadlines and their configuration are left out (_at_rest() checks the
+# timers), and so is frameInterval: per frame tweening does not depend on it.
+ANIM_FIELDS = tuple(sorted((
+    '_mood', 'tired', 'angry', 'happy', '_curious', '_cyclops', '_laugh', '_confused',
+    'eyeL_open', 'eyeR_open', 'laughToggle', 'confusedToggle', 'laughAnimationDuration', 'confusedAnimationDuration',
+    'screenWidth', 'screenHeight', 'fgcolor', 'bgcolor', 'tweenMode', 'tweens',
+    'spaceBetweenDefault', 'spaceBetweenCurrent', 'spaceBetweenNext',
+    'eyeLwidthDefault', 'eyeLheightDefault', 'eyeLborderRadiusDefault', 'eyeLxDefault', 'eyeLyDefault',
+    'eyeLwidthCurrent', 'eyeLheightCurrent', 'eyeLborderRadiusCurrent', 'eyeLx', 'eyeLy',
+    'eyeLwidthNext', 'eyeLheightNext', 'eyeLborderRadiusNext', 'eyeLxNext', 'eyeLyNext', 'eyeLheightOffset',
+    'eyeRwidthDefault', 'eyeRheightDefault', 'eyeRborderRadiusDefault', 'eyeRxDefault', 'eyeRyDefault',
+    'eyeRwidthCurrent', 'eyeRheightCurrent', 'eyeRborderRadiusCurrent', 'eyeRx', 'eyeRy',
+    'eyeRwidthNext', 'eyeRheightNext', 'eyeRborderRadiusNext', 'eyeRxNext', 'eyeRyNext', 'eyeRheightOffset',
+    'eyelidsHeightMax', 'eyelidsTiredHeight', 'eyelidsTiredHeightNext', 'eyelidsAngryHeight', 'eyelidsAngryHeightNext',
+    'eyelidsHappyBottomOffset', 'eyelidsHappyBottomOffsetNext', 'eyelidsHappyBottomOffsetMax',
+    'hFlicker', 'hFlickerAlternate', 'hFlickerAmplitude', 'vFlicker', 'vFlickerAlternate', 'vFlickerAmplitude',
+)))
+# Values of ANIM_FIELDS in one C call, what rest detection compares
+_anim_values = attrgetter(*ANIM_FIELDS)
 
 class RoboEyes:
-    def __init__(self, fb, width, height, frame_rate=20, on_show=None, bgcolor=BGCOLOR, fgcolor=FGCOLOR ):
+    def __init__(self, fb, width, height, frame_rate=20, on_show=None, bgcolor=BGCOLOR, fgcolor=FGCOLOR, frame_cache=None, clock=None ):
         self.fb = fb # NxtDisplay instance
         self.on_show = on_show
+        # Millisecond time source, a simulated clock allows headless rendering
+        self.clock = clock or ticks_ms
         self.screenWidth = width 
         self.screenHeight = height 
         self.bgcolor = bgcolor
@@ -324,8 +1134,48 @@ class RoboEyes:
         self.laughAnimationDuration = 500
         self.laughToggle = True
 
+        # Tweening, see set_tweening()
+        self.tweenMode = TWEEN_HALVING
+        self.tweenDurations = dict(TWEEN_DURATIONS)
+        self.tweenEasing = 'ease_out'
+        self.tweens = ()
+
+        # Frame memoization (see draw_eyes), a cache can be shared between eyes
+        self.frameCache = frame_cache if frame_cache is not None else FrameCache()
+        self._cacheable = hasattr(fb, 'get_frame')
+        # Dirty rectangles: (eye shapes, frame) last drawn, see _render()
+        self._clippable = self._cacheable and hasattr(fb, 'set_clip')
+        self._drawn = None
+        self.partialFrames = 0
+        # Draw with the single pass column compositor (see _composite)
+        self.compositor = self._cacheable
+        self._lastShown = None
+        self._shownErrors = 0 # fb.transport_errors when _lastShown was shown
+        self.showSkipped = 0
+
+        # run() loop state
+        self._running = False
+        self.framesSkipped = 0
+
+        # Rest detection: ANIM_FIELDS values of the last frame that changed nothing
+        self._restState = None
+        self.framesIdle = 0
+
+        # Pipeline instrumentation, off unless enable_stats() is called
+        self.frameStats = None
+        # Adaptive frame rate, see enable_adaptive_framerate()
+        self.rateController = None
+
+        # Pre-baked animations (see nxt_atlas.EyeAtlas)
+        self.atlas = None
+        self._atlasClip = None
+        self._atlasPos = 0
+        self._atlasCheck = False
+
         self.fb.clear()
-        if self.on_show: self.on_show(self)
+        if self.on_show:
+            self.on_show(self)
+            if self._cacheable: self._lastShown = self.fb.get_frame()
         self.eyeLheightCurrent = 1 
         self.eyeRheightCurrent = 1 
         self.set_framerate(frame_rate)
@@ -333,14 +1183,113 @@ class RoboEyes:
     def set_framerate(self, fps):
         self.frameInterval = 1000 // fps
 
+    # --- Tweening ---
+
+    def set_tweening(self, mode, durations=None, easing=None):
+        """Select how values move towards their targets.
+
+        TWEEN_HALVING (default) halves the distance every frame, the original
+        behaviour. TWEEN_TIME eases every value to its target in a fixed time,
+        so expressions keep their timing at any frame rate. durations maps the
+        groups of TWEEN_CHANNELS ('size', 'radius', 'move', 'eyelids') to ms,
+        easing is a key of EASINGS.
+        """
+        if mode not in (TWEEN_HALVING, TWEEN_TIME): raise ValueError(f"unknown tweening mode {mode!r}")
+        if easing is not None:
+            if easing not in EASINGS: raise ValueError(f"unknown easing {easing!r}")
+            self.tweenEasing = easing
+        if durations:
+            unknown = set(durations) - set(TWEEN_DURATIONS)
+            if unknown: raise ValueError(f"unknown tweening groups {sorted(unknown)}")
+            self.tweenDurations.update(durations)
+        if mode == TWEEN_TIME and self.tweenMode != TWEEN_TIME:
+            # Start settled on what is drawn now
+            yL = self.eyeLy - ((self.eyeLheightDefault - self.eyeLheightCurrent) // 2 - self.eyeLheightOffset // 2)
+            values = {'Lw': self.eyeLwidthCurrent, 'Lh': self.eyeLheightCurrent,
+                      'Rw': self.eyeRwidthCurrent, 'Rh': self.eyeRheightCurrent,
+                      'Lr': self.eyeLborderRadiusCurrent, 'Rr': self.eyeRborderRadiusCurrent,
+                      'space': self.spaceBetweenCurrent, 'x': self.eyeLx, 'y': yL,
+                      'tired': 1.0 if self.eyelidsTiredHeight else 0.0,
+                      'angry': 1.0 if self.eyelidsAngryHeight else 0.0,
+                      'happy': 1.0 if self.eyelidsHappyBottomOffset else 0.0}
+            self.tweens = tuple((values[name], values[name], None) for name, _ in TWEEN_CHANNELS)
+        elif mode == TWEEN_HALVING:
+            self.tweens = ()
+        self.tweenMode = mode
+
+    def _tweening(self):
+        return any(rec[2] is not None for rec in self.tweens)
+
+    def _tween(self, name, target, now):
+        """Current value of a time tweened channel, retargeted to `target`"""
+        i = _TWEEN_INDEX[name]
+        rec = self.tweens[i]
+        duration = self.tweenDurations[TWEEN_CHANNELS[i][1]]
+        ease = EASINGS[self.tweenEasing]
+        if target != rec[1]:
+            # New target: start from what the previous frame showed, so this
+            # frame already moves
+            t0 = now - self.frameInterval
+            rec = (_tween_value(rec, t0, duration, ease), target, t0)
+        elif rec[2] is None:
+            return target
+        value = _tween_value(rec, now, duration, ease)
+        if now - rec[2] >= duration: rec = (target, target, None)
+        if rec is not self.tweens[i]: self.tweens = self.tweens[:i] + (rec,) + self.tweens[i + 1:]
+        return value
+
+    def _tween_geometry(self, now):
+        # Time based counterpart of the halving block in draw_eyes
+        def px(name, target): return int(math.floor(self._tween(name, target, now) + 0.5))
+
+        self.eyeLheightCurrent = px('Lh', self.eyeLheightNext + self.eyeLheightOffset)
+        self.eyeRheightCurrent = px('Rh', self.eyeRheightNext + self.eyeRheightOffset)
+
+        # Re-open checks
+        if self.eyeL_open:
+            if self.eyeLheightCurrent <= (1 + self.eyeLheightOffset): self.eyeLheightNext = self.eyeLheightDefault
+        if self.eyeR_open:
+            if self.eyeRheightCurrent <= (1 + self.eyeRheightOffset): self.eyeRheightNext = self.eyeRheightDefault
+
+        self.eyeLwidthCurrent = px('Lw', self.eyeLwidthNext)
+        self.eyeRwidthCurrent = px('Rw', self.eyeRwidthNext)
+        self.spaceBetweenCurrent = px('space', self.spaceBetweenNext)
+
+        # Positions are tweened without the centring of shrunk eyes and
+        # without flicker, both are applied on top every frame
+        x = px('x', self.eyeLxNext)
+        y = px('y', self.eyeLyNext)
+        self.eyeLx = x
+        self.eyeLy = y + (self.eyeLheightDefault - self.eyeLheightCurrent) // 2 - self.eyeLheightOffset // 2
+        self.eyeRxNext = self.eyeLxNext + self.eyeLwidthCurrent + self.spaceBetweenCurrent
+        self.eyeRyNext = self.eyeLyNext
+        self.eyeRx = x + self.eyeLwidthCurrent + self.spaceBetweenCurrent
+        self.eyeRy = y + (self.eyeRheightDefault - self.eyeRheightCurrent) // 2 - self.eyeRheightOffset // 2
+
+        self.eyeLborderRadiusCurrent = px('Lr', self.eyeLborderRadiusNext)
+        self.eyeRborderRadiusCurrent = px('Rr', self.eyeRborderRadiusNext)
+
+    def _tween_eyelids(self, now):
+        # Eyelids follow the eye height, only showing/hiding them is tweened
+        half = self.eyeLheightCurrent // 2
+        tired = self.tired and not self.angry
+        self.eyelidsTiredHeightNext = half if tired else 0
+        self.eyelidsAngryHeightNext = half if self.angry else 0
+        self.eyelidsHappyBottomOffsetNext = half if self.happy else 0
+        self.eyelidsTiredHeight = int(self._tween('tired', 1.0 if tired else 0.0, now) * half)
+        self.eyelidsAngryHeight = int(self._tween('angry', 1.0 if self.angry else 0.0, now) * half)
+        self.eyelidsHappyBottomOffset = int(self._tween('happy', 1.0 if self.happy else 0.0, now) * half)
+
     # --- Macro Animations ---
 
     def confuse(self):
         """Play confused animation - one shot animation of eyes shaking left and right"""
+        self._atlas_event()
         self._confused = True
 
     def laugh(self):
         """Play laugh animation - one shot animation of eyes shaking up and down"""
+        self._atlas_event()
         self._laugh = True
 
     def wink(self, left=None, right=None):
@@ -354,12 +1303,173 @@ class RoboEyes:
 
     def update(self):
         self.sequences.update()
-        now = int(time.time() * 1000)
+        now = self.clock()
         if (now - self.fpsTimer) >= self.frameInterval:
-            self.draw_eyes()
+            if self._at_rest(now):
+                # Nothing moves and no timer is due: the frame would be
+                # identical to the one on screen, don't even draw it
+                self.framesIdle += 1
+                self.fpsTimer = now
+                return
+            st = self.frameStats
+            rc = self.rateController
+            if st is not None or rc is not None:
+                t0 = time.perf_counter()
+                late = self.fpsTimer and now - self.fpsTimer >= 2 * self.frameInterval
+            before = _anim_values(self)
+            if self.atlas is None or not self.atlas.play(self):
+                self.draw_eyes()
+            after = _anim_values(self)
+            # A frame the brick may not have got is redrawn (and resent) until it has
+            self._restState = after if after == before and not self._tweening() and self._confirmed() else None
             self.fpsTimer = now
+            if st is not None or rc is not None:
+                ms = (time.perf_counter() - t0) * 1000
+                if st is not None: st.end_frame(ms, self.frameInterval, late, now)
+                if rc is not None: rc.end_frame(self, ms)
+
+    def _at_rest(self, now):
+        if self._restState is None: return False
+        if self.autoblinker and (now - self.blinktimer) >= 0: return False
+        if self.idle and (now - self.idleAnimationTimer) >= 0: return False
+        if _anim_values(self) != self._restState or not self._confirmed():
+            self._restState = None
+            return False
+        return True
+
+    def wake(self):
+        """Draw the next frame even if the eyes are at rest, e.g. after
+        something else was drawn on the display"""
+        self._restState = None
+        self._lastShown = None
+
+    # --- Adaptive frame rate ---
+
+    def enable_adaptive_framerate(self, min_fps=5, max_fps=30, headroom=ADAPT_HEADROOM, tune_merge_gap=True):
+        """Let the measured link throughput pick the frame rate, see
+        RateController. Best combined with set_tweening(TWEEN_TIME), so
+        expressions keep their speed while the rate changes."""
+        self.rateController = RateController(min_fps, max_fps, headroom, tune_merge_gap)
+        if hasattr(self.fb, 'rate_controller'): self.fb.rate_controller = self.rateController
+        return self.rateController
+
+    def disable_adaptive_framerate(self, fps=None):
+        """Back to a fixed rate: fps, or the last adaptive one"""
+        self.rateController = None
+        if hasattr(self.fb, 'rate_controller'): self.fb.rate_controller = None
+        if fps: self.set_framerate(fps)
+
+    # --- Instrumentation ---
+
+    def enable_stats(self, window=STATS_WINDOW, log_every=None, log_hook=None):
+        """Start collecting per-stage frame timings, see stats().
+        With log_every (seconds) a summary goes to log_hook(stats_dict), or
+        to the 'nxt_roboeyes' logger when no hook is given."""
+        self.frameStats = FrameStats(window, log_every, log_hook)
+        if hasattr(self.fb, 'frame_stats'): self.fb.frame_stats = self.frameStats
+        return self.frameStats
+
+    def disable_stats(self):
+        self.frameStats = None
+        if hasattr(self.fb, 'frame_stats'): self.fb.frame_stats = None
+
+    def stats(self):
+        """Pipeline statistics dict, None while instrumentation is off"""
+        if self.frameStats is None: return None
+        report = self.frameStats.stats()
+        report['cache_hits'] = self.frameCache.hits
+        report['cache_misses'] = self.frameCache.misses
+        report['show_skipped'] = self.showSkipped
+        report['frames_idle'] = self.framesIdle
+        if self.rateController is not None: report['effective_fps'] = self.rateController.fps
+        transport = getattr(self.fb, 'transport', None)
+        if transport is not None:
+            report['frames_sent'] = transport.frames_sent
+            report['frames_dropped'] = transport.frames_dropped
+        return report
+
+    # --- Run loops ---
+
+    def next_deadline(self):
+        """Clock time (ms) at which update() has work to do next, None if
+        the eyes are at rest and only an API call can wake them"""
+        deadline = self.fpsTimer + self.frameInterval
+        # API calls leave rest (_atlas_event); direct attribute writes are
+        # seen by the next update(), at most max_sleep later in the run loops
+        if self._restState is not None:
+            timers = []
+            if self.autoblinker: timers.append(self.blinktimer)
+            if self.idle: timers.append(self.idleAnimationTimer)
+            deadline = max(deadline, min(timers)) if timers else None
+        seq = self.sequences.next_deadline()
+        if seq is not None and (deadline is None or seq < deadline): deadline = seq
+        return deadline
+
+    def _tick(self):
+        prev = self.fpsTimer
+        now = self.clock()
+        self.update()
+        if prev and self.fpsTimer == now:
+            # Keep a fixed cadence: the next frame is due one interval after
+            # this one was due, not after we woke up. Fell behind by whole
+            # frames -> drop them and restart the cadence from now.
+            due = prev + self.frameInterval
+            late = now - due
+            if late >= self.frameInterval: self.framesSkipped += late // self.frameInterval
+            elif late > 0: self.fpsTimer = due
+
+    def _sleep_time(self, max_sleep):
+        deadline = self.next_deadline()
+        if deadline is None: return max_sleep
+        return min((deadline - self.clock()) / 1000, max_sleep)
+
+    def run(self, on_tick=None, max_sleep=RUN_MAX_SLEEP):
+        """Blocking animation loop, sleeps until the next frame or sequence
+        step instead of polling. on_tick(eyes) is called after every
+        wake-up; stop() or a KeyboardInterrupt ends the loop."""
+        self._running = True
+        while self._running:
+            self._tick()
+            if on_tick: on_tick(self)
+            delay = self._sleep_time(max_sleep)
+            if delay > 0: time.sleep(delay)
+
+    async def run_async(self, on_tick=None, max_sleep=RUN_MAX_SLEEP):
+        """asyncio flavour of run(), on_tick may be a coroutine function"""
+        self._running = True
+        while self._running:
+            self._tick()
+            if on_tick:
+                res = on_tick(self)
+                if asyncio.iscoroutine(res): await res
+            delay = self._sleep_time(max_sleep)
+            await asyncio.sleep(delay if delay > 0 else 0)
+
+    def stop(self):
+        """Make run()/run_async() return after the current tick"""
+        self._running = False
+
+    # --- Animation state ---
+
+    def anim_state(self):
+        """Hashable snapshot of everything that drives the next frames"""
+        return tuple(zip(ANIM_FIELDS, _anim_values(self)))
+
+    def set_anim_state(self, state):
+        for k, v in state: setattr(self, k, v)
+
+    def _atlas_event(self):
+        # Called when the animation API changes state: the eyes leave rest,
+        # a running atlas clip stops (its live state is already applied)
+        # and the next frame looks for a clip that starts from the new state.
+        self._restState = None
+        if self.atlas is not None:
+            self._atlasClip = None
+            self._atlasCheck = True
 
     def draw_eyes(self):
+        st = self.frameStats
+        if st is not None: t0 = time.perf_counter()
         # ... logic ported from original ...
         # Curious offsets
         if self._curious:
@@ -374,37 +1484,40 @@ class RoboEyes:
             self.eyeRheightOffset = 0
 
         # Tweening
-        self.eyeLheightCurrent = (self.eyeLheightCurrent + self.eyeLheightNext + self.eyeLheightOffset) // 2
-        self.eyeLy += (self.eyeLheightDefault - self.eyeLheightCurrent) // 2
-        self.eyeLy -= self.eyeLheightOffset // 2
-
-        self.eyeRheightCurrent = (self.eyeRheightCurrent + self.eyeRheightNext + self.eyeRheightOffset) // 2
-        self.eyeRy += (self.eyeRheightDefault - self.eyeRheightCurrent) // 2
-        self.eyeRy -= self.eyeRheightOffset // 2
-
-        # Re-open checks
-        if self.eyeL_open:
-            if self.eyeLheightCurrent <= (1 + self.eyeLheightOffset): self.eyeLheightNext = self.eyeLheightDefault
-        if self.eyeR_open:
-            if self.eyeRheightCurrent <= (1 + self.eyeRheightOffset): self.eyeRheightNext = self.eyeRheightDefault
-
-        self.eyeLwidthCurrent = (self.eyeLwidthCurrent + self.eyeLwidthNext) // 2
-        self.eyeRwidthCurrent = (self.eyeRwidthCurrent + self.eyeRwidthNext) // 2
-        self.spaceBetweenCurrent = (self.spaceBetweenCurrent + self.spaceBetweenNext) // 2
-
-        self.eyeLx = (self.eyeLx + self.eyeLxNext) // 2
-        self.eyeLy = (self.eyeLy + self.eyeLyNext) // 2
+        if self.tweenMode == TWEEN_TIME:
+            self._tween_geometry(self.clock())
+        else:
+            self.eyeLheightCurrent = (self.eyeLheightCurrent + self.eyeLheightNext + self.eyeLheightOffset) // 2
+            self.eyeLy += (self.eyeLheightDefault - self.eyeLheightCurrent) // 2
+            self.eyeLy -= self.eyeLheightOffset // 2
+
+            self.eyeRheightCurrent = (self.eyeRheightCurrent + self.eyeRheightNext + self.eyeRheightOffset) // 2
+            self.eyeRy += (self.eyeRheightDefault - self.eyeRheightCurrent) // 2
+            self.eyeRy -= self.eyeRheightOffset // 2
+
+            # Re-open checks
+            if self.eyeL_open:
+                if self.eyeLheightCurrent <= (1 + self.eyeLheightOffset): self.eyeLheightNext = self.eyeLheightDefault
+            if self.eyeR_open:
+                if self.eyeRheightCurrent <= (1 + self.eyeRheightOffset): self.eyeRheightNext = self.eyeRheightDefault
+
+            self.eyeLwidthCurrent = (self.eyeLwidthCurrent + self.eyeLwidthNext) // 2
+            self.eyeRwidthCurrent = (self.eyeRwidthCurrent + self.eyeRwidthNext) // 2
+            self.spaceBetweenCurrent = (self.spaceBetweenCurrent + self.spaceBetweenNext) // 2
+
+            self.eyeLx = (self.eyeLx + self.eyeLxNext) // 2
+            self.eyeLy = (self.eyeLy + self.eyeLyNext) // 2
         
-        self.eyeRxNext = self.eyeLxNext + self.eyeLwidthCurrent + self.spaceBetweenCurrent
-        self.eyeRyNext = self.eyeLyNext
-        self.eyeRx = (self.eyeRx + self.eyeRxNext) // 2
-        self.eyeRy = (self.eyeRy + self.eyeRyNext) // 2
+            self.eyeRxNext = self.eyeLxNext + self.eyeLwidthCurrent + self.spaceBetweenCurrent
+            self.eyeRyNext = self.eyeLyNext
+            self.eyeRx = (self.eyeRx + self.eyeRxNext) // 2
+            self.eyeRy = (self.eyeRy + self.eyeRyNext) // 2
 
-        self.eyeLborderRadiusCurrent = (self.eyeLborderRadiusCurrent + self.eyeLborderRadiusNext) // 2
-        self.eyeRborderRadiusCurrent = (self.eyeRborderRadiusCurrent + self.eyeRborderRadiusNext) // 2
+            self.eyeLborderRadiusCurrent = (self.eyeLborderRadiusCurrent + self.eyeLborderRadiusNext) // 2
+            self.eyeRborderRadiusCurrent = (self.eyeRborderRadiusCurrent + self.eyeRborderRadiusNext) // 2
 
         # Animations
-        now = int(time.time() * 1000)
+        now = self.clock()
         
         if self.autoblinker:
             if (now - self.blinktimer) >= 0:
@@ -461,32 +1574,193 @@ class RoboEyes:
             self.eyeRheightCurrent = 0
             self.spaceBetweenCurrent = 0
 
+        # Eyelids calculations
+        if self.tweenMode == TWEEN_TIME:
+            self._tween_eyelids(now)
+        else:
+            if self.tired:
+                self.eyelidsTiredHeightNext = self.eyeLheightCurrent // 2
+                self.eyelidsAngryHeightNext = 0
+            else:
+                self.eyelidsTiredHeightNext = 0
+            if self.angry:
+                self.eyelidsAngryHeightNext = self.eyeLheightCurrent // 2
+                self.eyelidsTiredHeightNext = 0
+            else:
+                self.eyelidsAngryHeightNext = 0
+            if self.happy:
+                self.eyelidsHappyBottomOffsetNext = self.eyeLheightCurrent // 2
+            else:
+                self.eyelidsHappyBottomOffsetNext = 0
+
+            self.eyelidsTiredHeight = (self.eyelidsTiredHeight + self.eyelidsTiredHeightNext) // 2
+            self.eyelidsAngryHeight = (self.eyelidsAngryHeight + self.eyelidsAngryHeightNext) // 2
+            self.eyelidsHappyBottomOffset = (self.eyelidsHappyBottomOffset + self.eyelidsHappyBottomOffsetNext) // 2
+
+        if st is not None:
+            t1 = time.perf_counter()
+            st.add('update', (t1 - t0) * 1000)
+
         # DRAWING
-        self.fb.clear()
-        
+        # Same resolved geometry -> same pixels, reuse the cached frame
+        frame = None
+        if self._cacheable:
+            key = self.frame_key()
+            frame = self.frameCache.get(key)
+            if frame is not None:
+                self.fb.set_frame(frame, self._frame_rects())
+            else:
+                self._render()
+                frame = self.fb.get_frame()
+                self.frameCache.put(key, frame)
+            if self._clippable: self._drawn = (self._eye_shapes(), frame)
+        else:
+            self._render()
+
+        if st is not None:
+            t2 = time.perf_counter()
+            st.add('raster', (t2 - t1) * 1000)
+        self._show(frame)
+        if st is not None: st.add('show', (time.perf_counter() - t2) * 1000)
+
+    def show_frame(self, frame):
+        """Put a pre-rendered frame (NXT page layout) on the display"""
+        self.fb.set_frame(frame)
+        self._show(frame)
+
+    def _show(self, frame):
+        if self.on_show:
+            if frame is not None and frame == self._lastShown and self._on_screen(frame):
+                self.showSkipped += 1
+            else:
+                self._lastShown = frame
+                self._shownErrors = getattr(self.fb, 'transport_errors', 0)
+                self.on_show(self)
+
+    def _confirmed(self):
+        """False while the display does not know what the screen shows:
+        invalidated, or a send failed since the last on_show"""
+        fb = self.fb
+        if not getattr(fb, 'use_iomap', True): return True # sends nothing
+        if getattr(fb, '_sent', True) is None: return False
+        return getattr(fb, 'transport_errors', 0) == self._shownErrors
+
+    def _on_screen(self, frame):
+        """False if the display may not show `frame`: something else was
+        sent since, the screen content is unknown or a send failed"""
+        if not self._confirmed(): return False
+        last = getattr(self.fb, 'last_frame', None)
+        return last is None or last == frame
+
+    def frame_key(self):
+        """Everything the rendered frame depends on, once tweening is done"""
+        return (self.eyeLx, self.eyeLy, self.eyeLwidthCurrent, self.eyeLheightCurrent, self.eyeLborderRadiusCurrent,
+                self.eyeRx, self.eyeRy, self.eyeRwidthCurrent, self.eyeRheightCurrent, self.eyeRborderRadiusCurrent,
+                self.eyelidsTiredHeight, self.eyelidsAngryHeight, self.eyelidsHappyBottomOffset, self._cyclops,
+                self.eyeLheightDefault, self.eyeRheightDefault, self.fgcolor, self.bgcolor)
+
+    def _eye_shapes(self):
+        """Per eye everything its eye and eyelid shapes depend on, plus what
+        all shapes depend on"""
+        left = (self.eyeLx, self.eyeLy, self.eyeLwidthCurrent, self.eyeLheightCurrent, self.eyeLborderRadiusCurrent,
+                self.eyelidsTiredHeight, self.eyelidsAngryHeight, self.eyelidsHappyBottomOffset, self.eyeLheightDefault)
+        right = None
+        if not self._cyclops:
+            right = (self.eyeRx, self.eyeRy, self.eyeRwidthCurrent, self.eyeRheightCurrent, self.eyeRborderRadiusCurrent,
+                     self.eyelidsTiredHeight, self.eyelidsAngryHeight, self.eyelidsHappyBottomOffset, self.eyeRheightDefault)
+        return left, right, self._cyclops, self.fgcolor, self.bgcolor
+
+    def _dirty_rects(self):
+        """Boxes that differ from the last drawn frame, None = redraw all"""
+        drawn = self._drawn
+        if drawn is None or self.bgcolor: return None
+        shapes = self._eye_shapes()
+        if shapes[2:] != drawn[0][2:]: return None
+        # Something else was drawn on the display in between
+        if self.fb.get_frame() != drawn[1]: return None
+        old = drawn[0]
+        changed = [i for i in (0, 1) if old[i] != shapes[i]]
+        if not changed: return []
+        # Eyelid heights are shared, so a blink or mood change touches both
+        # eyes and most of the screen: repaint all of it
+        if len(changed) == 2: return None
+        i = changed[0]
+        keys = [k for k in (old[i], shapes[i]) if k is not None]
+        other = shapes[1 - i]
+        # Eyelids only erase, so they matter only where an eye is or was
+        area = None
+        for k in keys + [other]:
+            if k is not None: area = _union_box(area, _eye_boxes(k)[0])
+        rect = None
+        for k in keys:
+            eye, lids = _eye_boxes(k)
+            rect = _union_box(_union_box(rect, eye), _intersect_box(lids, area))
+        # Clipping only pays off for a small part of the screen
+        if rect is None or _box_area(rect) > DIRTY_MAX_AREA: return None
+        return [rect]
+
+    def _composite(self):
+        """The frame _paint() would draw, each pixel computed once: eyes
+        minus eyelids per column. None when it can't (inverted colors,
+        shapes far off screen), then the frame is painted as usual."""
+        if self.fgcolor != FGCOLOR or self.bgcolor != BGCOLOR: return None
+        x, y, w, h, r = self.eyeLx, self.eyeLy, self.eyeLwidthCurrent, self.eyeLheightCurrent, self.eyeLborderRadiusCurrent
+        eyes = _place_rrect(x, y, w, h, r)
+        hl = self.eyeLheightDefault
+        happy = _place_rrect(x - 1, y + h - self.eyelidsHappyBottomOffset + 1, w + 2, hl, r)
+        tired, angry = self.eyelidsTiredHeight, self.eyelidsAngryHeight
+        if self._cyclops:
+            m = x + w // 2
+            lids = (_triangle_columns(x, y - 1, m, y - 1, x, y + tired - 1)
+                    | _triangle_columns(m, y - 1, x + w, y - 1, x + w, y + tired - 1)
+                    | _triangle_columns(x, y - 1, m, y - 1, m, y + angry - 1)
+                    | _triangle_columns(m, y - 1, x + w, y - 1, m, y + angry - 1))
+        else:
+            rx, ry, rw, rh, rr = self.eyeRx, self.eyeRy, self.eyeRwidthCurrent, self.eyeRheightCurrent, self.eyeRborderRadiusCurrent
+            right = _place_rrect(rx, ry, rw, rh, rr)
+            right_happy = _place_rrect(rx - 1, ry + rh - self.eyelidsHappyBottomOffset + 1, rw + 2, self.eyeRheightDefault, rr)
+            if right is None or right_happy is None: return None
+            eyes = None if eyes is None else eyes | right
+            happy = None if happy is None else happy | right_happy
+            lids = (_triangle_columns(x, y - 1, x + w, y - 1, x, y + tired - 1)
+                    | _triangle_columns(rx, ry - 1, rx + rw, ry - 1, rx + rw, ry + tired - 1)
+                    | _triangle_columns(x, y - 1, x + w, y - 1, x + w, y + angry - 1)
+                    | _triangle_columns(rx, ry - 1, rx + rw, ry - 1, rx, ry + angry - 1))
+        if eyes is None or happy is None: return None
+        return _column_frame(eyes & ~(lids | happy))
+
+    def _frame_rects(self):
+        # Boxes where the next frame differs from the drawn one, None = anywhere
+        rects = self._dirty_rects() if self._clippable else None
+        if rects is not None: self.partialFrames += 1
+        return rects
+
+    def _render(self):
+        rects = self._frame_rects()
+        if self.compositor:
+            frame = self._composite()
+            if frame is not None:
+                # Whole frame, but update() only compares around the changed eye
+                self.fb.set_frame(frame, rects)
+                return
+        if rects is None:
+            self.fb.clear()
+            self._paint()
+            return
+        # Clear and repaint only around the eyes that changed
+        for rect in rects:
+            self.fb.set_clip(rect)
+            self.fb.clear()
+            self._paint()
+        self.fb.set_clip()
+
+    def _paint(self):
         # Eyes
         self.fb.fill_rrect(self.eyeLx, self.eyeLy, self.eyeLwidthCurrent, self.eyeLheightCurrent, self.eyeLborderRadiusCurrent, self.fgcolor)
         if not self._cyclops:
             self.fb.fill_rrect(self.eyeRx, self.eyeRy, self.eyeRwidthCurrent, self.eyeRheightCurrent, self.eyeRborderRadiusCurrent, self.fgcolor)
 
-        # Eyelids calculations
-        if self.tired:
-            self.eyelidsTiredHeightNext = self.eyeLheightCurrent // 2
-            self.eyelidsAngryHeightNext = 0
-        else:
-            self.eyelidsTiredHeightNext = 0
-        if self.angry:
-            self.eyelidsAngryHeightNext = self.eyeLheightCurrent // 2
-            self.eyelidsTiredHeightNext = 0
-        else:
-            self.eyelidsAngryHeightNext = 0
-        if self.happy:
-            self.eyelidsHappyBottomOffsetNext = self.eyeLheightCurrent // 2
-        else:
-            self.eyelidsHappyBottomOffsetNext = 0
-
         # Tired
-        self.eyelidsTiredHeight = (self.eyelidsTiredHeight + self.eyelidsTiredHeightNext) // 2
         if not self._cyclops:
             self.fb.fill_triangle(self.eyeLx, self.eyeLy-1, self.eyeLx+self.eyeLwidthCurrent, self.eyeLy-1, self.eyeLx, self.eyeLy+self.eyelidsTiredHeight-1, self.bgcolor)
             self.fb.fill_triangle(self.eyeRx, self.eyeRy-1, self.eyeRx+self.eyeRwidthCurrent, self.eyeRy-1, self.eyeRx+self.eyeRwidthCurrent, self.eyeRy+self.eyelidsTiredHeight-1, self.bgcolor)
@@ -495,7 +1769,6 @@ class RoboEyes:
             self.fb.fill_triangle(self.eyeLx+(self.eyeLwidthCurrent//2), self.eyeLy-1, self.eyeLx+self.eyeLwidthCurrent, self.eyeLy-1, self.eyeLx+self.eyeLwidthCurrent, self.eyeLy+self.eyelidsTiredHeight-1, self.bgcolor)
 
         # Angry
-        self.eyelidsAngryHeight = (self.eyelidsAngryHeight + self.eyelidsAngryHeightNext) // 2
         if not self._cyclops:
             self.fb.fill_triangle(self.eyeLx, self.eyeLy-1, self.eyeLx+self.eyeLwidthCurrent, self.eyeLy-1, self.eyeLx+self.eyeLwidthCurrent, self.eyeLy+self.eyelidsAngryHeight-1, self.bgcolor)
             self.fb.fill_triangle(self.eyeRx, self.eyeRy-1, self.eyeRx+self.eyeRwidthCurrent, self.eyeRy-1, self.eyeRx, self.eyeRy+self.eyelidsAngryHeight-1, self.bgcolor)
@@ -504,13 +1777,10 @@ class RoboEyes:
              self.fb.fill_triangle(self.eyeLx+(self.eyeLwidthCurrent//2), self.eyeLy-1, self.eyeLx+self.eyeLwidthCurrent, self.eyeLy-1, self.eyeLx+(self.eyeLwidthCurrent//2), self.eyeLy+self.eyelidsAngryHeight-1, self.bgcolor)
 
         # Happy
-        self.eyelidsHappyBottomOffset = (self.eyelidsHappyBottomOffset + self.eyelidsHappyBottomOffsetNext) // 2
         self.fb.fill_rrect(self.eyeLx-1, (self.eyeLy+self.eyeLheightCurrent)-self.eyelidsHappyBottomOffset+1, self.eyeLwidthCurrent+2, self.eyeLheightDefault, self.eyeLborderRadiusCurrent, self.bgcolor)
         if not self._cyclops:
              self.fb.fill_rrect(self.eyeRx-1, (self.eyeRy+self.eyeRheightCurrent)-self.eyelidsHappyBottomOffset+1, self.eyeRwidthCurrent+2, self.eyeRheightDefault, self.eyeRborderRadiusCurrent, self.bgcolor)
 
-        if self.on_show: self.on_show(self)
-
     # ... Setters/Getters ...
     def get_screen_constraint_X(self):
         return self.screenWidth - self.eyeLwidthCurrent - self.spaceBetweenCurrent - self.eyeRwidthCurrent
@@ -527,6 +1797,7 @@ class RoboEyes:
             self.open(left, right)
 
     def close(self, left=None, right=None):
+        self._atlas_event()
         if left is None and right is None:
             self.eyeLheightNext = 1
             self.eyeRheightNext = 1
@@ -541,6 +1812,7 @@ class RoboEyes:
                 self.eyeR_open = False
 
     def open(self, left=None, right=None):
+        self._atlas_event()
         if left is None and right is None:
             self.eyeL_open = True
             self.eyeR_open = True
@@ -550,11 +1822,13 @@ class RoboEyes:
 
     def set_auto_blinker(self, active, interval=None, variation=None):
         self.autoblinker = active
+        self._restState = None
         if interval is not None: self.blinkInterval = interval
         if variation is not None: self.blinkIntervalVariation = variation
 
     def set_idle_mode(self, active, interval=None, variation=None):
         self.idle = active
+        self._restState = None
         if interval is not None: self.idleInterval = interval
         if variation is not None: self.idleIntervalVariation = variation
 
@@ -563,6 +1837,7 @@ class RoboEyes:
 
     @mood.setter
     def mood(self, mood):
+        self._atlas_event()
         if (self._mood in (SCARY, FROZEN)) and not (mood in (SCARY, FROZEN)):
             self.horiz_flicker(False)
             self.vert_flicker(False)
@@ -593,6 +1868,16 @@ class RoboEyes:
 
     def set_mood(self, value): self.mood = value
 
+    @property
+    def cyclops(self): return self._cyclops
+
+    @cyclops.setter
+    def cyclops(self, active):
+        self._atlas_event()
+        self._cyclops = bool(active)
+
+    def set_cyclops(self, active): self.cyclops = active
+
     def horiz_flicker(self, enable, amplitude=None):
         self.hFlicker = enable
         if amplitude is not None: self.hFlickerAmplitude = amplitude
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""NXT framebuffer in shared memory, drawn by one process and sent by another.
+
+The segment holds a sequence counter (u32, little endian) followed by
+the 800-byte page layout frame. It works as a seqlock: the writer makes
+the counter odd before touching the frame and even again when the frame
+is complete, a reader copies the frame and keeps the copy only if the
+counter was even and unchanged around the copy. Nothing is pickled or
+piped; the reader's single 800-byte copy is what goes to the brick.
+
+Drawing process (RoboEyes, a vision overlay, ...):
+
+    disp = ShmDisplay(name='nxt-eyes', create=True)
+    eyes = RoboEyes(disp, 100, 64, on_show=lambda e: e.fb.update())
+
+Process that owns the brick:
+
+    sender = ShmSender(NxtDisplay(brick, async_transport=True), SharedFrame('nxt-eyes'))
+    sender.run()
+
+The drawing side creates the segment (create=True, which is also what
+happens when no name is given: the segment gets a generated name, see
+.name) and removes it in close(); the sending side attaches by name.
+
+One writer at a time: processes that draw into the same segment must take
+turns (each frame from the first drawing call to update()).
+"""
+import struct
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+from nxt_roboeyes import NxtDisplay, BUFFER_SIZE
+
+SEQ = struct.Struct('<I')
+SEGMENT_SIZE = SEQ.size + BUFFER_SIZE
+# Sender poll interval (ms) and attempts at a consistent copy per poll
+POLL_MS = 5
+READ_RETRIES = 3
+
+
+def _attach(name, create):
+    if create: return shared_memory.SharedMemory(name, True, SEGMENT_SIZE)
+    if sys.version_info >= (3, 13): return shared_memory.SharedMemory(name, track=False)
+    # Before 3.13 attaching registers the segment with the resource tracker,
+    # which would remove it when this process exits (what track=False avoids)
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name)
+    finally:
+        resource_tracker.register = register
+
+
+class SharedFrame:
+    """Seqlocked 800-byte frame in a multiprocessing.shared_memory segment.
+    create: make a new segment (default when there is no name) instead of
+    attaching to the existing segment `name`"""
+    def __init__(self, name=None, create=None):
+        if create is None: create = name is None
+        if name is None and not create: raise ValueError("attaching to a segment needs its name")
+        self.shm = _attach(name, create)
+        if self.shm.size < SEGMENT_SIZE: raise ValueError(f"segment {self.shm.name!r} is too small for a frame")
+        self.name = self.shm.name
+        self.owner = create
+        self.frame = self.shm.buf[SEQ.size:SEGMENT_SIZE] # memoryview, no copy
+
+    @property
+    def seq(self):
+        return SEQ.unpack_from(self.shm.buf, 0)[0]
+
+    def begin(self):
+        """Writer: the frame is about to change (counter odd)"""
+        seq = self.seq
+        if not seq & 1: SEQ.pack_into(self.shm.buf, 0, (seq + 1) & 0xFFFFFFFF)
+
+    def commit(self):
+        """Writer: the frame is complete (counter even)"""
+        seq = self.seq
+        SEQ.pack_into(self.shm.buf, 0, (seq + (1 if seq & 1 else 2)) & 0xFFFFFFFF)
+
+    def write(self, frame):
+        """Writer: replace the whole frame"""
+        self.begin()
+        self.frame[:] = frame
+        self.commit()
+
+    def read(self, retries=READ_RETRIES):
+        """Reader: (seq, frame bytes) of the last complete frame, None if
+        the writer kept changing it during every attempt"""
+        for _ in range(retries):
+            seq = self.seq
+            if seq & 1: continue
+            frame = bytes(self.frame)
+            if self.seq == seq: return seq, frame
+        return None
+
+    def close(self):
+        """Detach; the process that created the segment also removes it"""
+        self.frame.release()
+        self.shm.close()
+        if self.owner: self.shm.unlink()
+
+
+class ShmDisplay(NxtDisplay):
+    """NxtDisplay whose buffer is the shared frame. Drawing opens a frame
+    (counter odd), update() publishes it and, with a brick, sends it too.
+    name/create as for SharedFrame: without a name a new segment is made."""
+    def __init__(self, brick=None, name=None, create=None, **kw):
+        super().__init__(brick, **kw)
+        self.shared = SharedFrame(name, create)
+        self.buf = self.shared.frame
+        self._open = False
+
+    def _begin(self):
+        if not self._open:
+            self.shared.begin()
+            self._open = True
+
+    def fill(self, color):
+        self._begin()
+        super().fill(color)
+
+    def set_pixel(self, x, y, color):
+        self._begin()
+        super().set_pixel(x, y, color)
+
+    def set_frame(self, frame, dirty=None):
+        self._begin()
+        super().set_frame(frame, dirty)
+
+    def fill_rect(self, x, y, w, h, color):
+        self._begin()
+        super().fill_rect(x, y, w, h, color)
+
+    def fill_rrect(self, x, y, w, h, r, color):
+        self._begin()
+        super().fill_rrect(x, y, w, h, r, color)
+
+    def fill_triangle(self, x0, y0, x1, y1, x2, y2, color):
+        self._begin()
+        super().fill_triangle(x0, y0, x1, y1, x2, y2, color)
+
+    def update(self, force_full=False):
+        self.shared.commit()
+        self._open = False
+        super().update(force_full)
+
+    def close(self, timeout=None):
+        super().close(timeout)
+        self.buf = bytearray(self.buf) # keep a private copy, the segment goes away
+        self.shared.close()
+
+
+class ShmSender:
+    """Sends every new complete frame of a SharedFrame through `display`
+    (an NxtDisplay, so delta transport, pipelining etc. apply)"""
+    def __init__(self, display, shared, poll_ms=POLL_MS):
+        self.display = display
+        self.shared = shared
+        self.poll_ms = poll_ms
+        self.frames = 0
+        self.busy = 0 # polls that found the writer mid-frame every time
+        self._last = None
+        self._running = False
+
+    def poll(self):
+        """Send the shared frame if it changed since the last one. True if sent"""
+        seq = self.shared.seq
+        if seq == self._last: return False
+        snap = self.shared.read()
+        if snap is None:
+            self.busy += 1
+            return False
+        seq, frame = snap
+        if seq == self._last: return False
+        self._last = seq
+        self.display.set_frame(frame)
+        self.display.update()
+        self.frames += 1
+        return True
+
+    def run(self):
+        self._running = True
+        while self._running:
+            if not self.poll(): time.sleep(self.poll_ms / 1000)
+
+    def stop(self):
+        self._running = False
@@ -1,54 +1,47 @@
 #!/usr/bin/env python3
 import time
-import os
 import sys
 import nxt.locator
-from nxt.backend.devfile import DevFileSock
-from nxt_roboeyes import NxtDisplay, RoboEyes, SCREEN_W, SCREEN_H, HAPPY, ANGRY, TIRED, DEFAULT
+from nxt_roboeyes import NxtDisplay, RoboEyes, SCREEN_W, SCREEN_H, HAPPY, ANGRY, TIRED, DEFAULT, TWEEN_TIME
+from nxt_connect import ConnectionManager
 
 def main():
-    brick = None
-    # Try Bluetooth first if device exists
-    if os.path.exists('/dev/rfcomm0'):
-        try:
-            print("Connecting via /dev/rfcomm0...")
-            brick = DevFileSock('/dev/rfcomm0').connect()
-        except Exception as e:
-            print(f"Bluetooth connection failed: {e}")
-
-    # Fallback to USB/Locator
-    if not brick:
-        print("Searching for NXT via USB/Bluetooth locator...")
-        try:
-            with nxt.locator.find() as b:
-                brick = b
-        except nxt.locator.BrickNotFoundError:
-            print("No NXT brick found.")
-            sys.exit(1)
-        except Exception as e:
-            print(f"Error locating brick: {e}")
-            sys.exit(1)
-
-    if not brick:
-        print("Could not connect to NXT.")
+    # Last working link from the cache, else the fastest of rfcomm/USB/Bluetooth.
+    # A dropped link reconnects in the background while the eyes keep going.
+    print("Connecting to NXT...")
+    try:
+        brick = ConnectionManager().connect(reconnect=True)
+    except nxt.locator.BrickNotFoundError:
+        print("No NXT brick found.")
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error locating brick: {e}")
         sys.exit(1)
 
     print("Connected to NXT.")
     
     # Initialize Display Wrapper
+    # (frames are sent from a background thread, the animation never waits for the bus)
     try:
-        disp = NxtDisplay(brick)
+        disp = NxtDisplay(brick, async_transport=True)
     except RuntimeError as e:
         print(f"Display Init Error: {e}")
         sys.exit(1)
+    brick.attach(disp)
+    # Biggest writes the link takes, sent without waiting for each reply
+    if not disp.enable_pipelining():
+        print("No-reply writes not supported, using one reply per write.")
 
     # Callback for screen update
     def show_cb(re):
         re.fb.update()
 
     # Initialize RoboEyes
-    # reduced framerate to match NXT slow bus speed
+    # start at 10 fps, then let the measured bus speed pick the rate
+    # (time based tweening keeps blinks equally fast at any rate)
     eyes = RoboEyes(disp, SCREEN_W, SCREEN_H, frame_rate=10, on_show=show_cb)
+    eyes.set_tweening(TWEEN_TIME)
+    eyes.enable_adaptive_framerate(min_fps=5, max_fps=25)
     
     eyes.set_auto_blinker(True, 2, 1)
     eyes.set_idle_mode(True, 3, 2)
@@ -60,32 +53,31 @@ def main():
     modes = [DEFAULT, HAPPY, ANGRY, TIRED]
     mode_names = ["Default", "Happy", "Angry", "Tired"]
 
-    try:
-        while True:
-            eyes.update()
-            
-            # Switch mood every 5 seconds
-            if time.time() - start_time > 10:
-                mode = (mode + 1) % len(modes)
-                eyes.mood = modes[mode]
-                print(f"Switching mood to: {mode_names[mode]}")
-                start_time = time.time()
-                
-                # Trigger specific animations on switch
-                if modes[mode] == HAPPY:
-                    eyes.laugh()
-                elif modes[mode] == ANGRY:
-                    eyes.confuse()
+    def switch_mood(eyes):
+        nonlocal start_time, mode
+        # Switch mood every 10 seconds
+        if time.time() - start_time > 10:
+            mode = (mode + 1) % len(modes)
+            eyes.mood = modes[mode]
+            print(f"Switching mood to: {mode_names[mode]}")
+            start_time = time.time()
             
-            # Small sleep to prevent 100% CPU usage on host, 
-            # though eyes.update() limits framerate internally, 
-            # the loop is tight.
-            time.sleep(0.01)
+            # Trigger specific animations on switch
+            if modes[mode] == HAPPY:
+                eyes.laugh()
+            elif modes[mode] == ANGRY:
+                eyes.confuse()
+
+    try:
+        # Sleeps until the next frame/timer instead of spinning
+        eyes.run(on_tick=switch_mood)
 
     except KeyboardInterrupt:
         print("\nStopping...")
         disp.clear()
         disp.update()
+        disp.close()
+        brick.close()
 
 if __name__ == "__main__":
     main()